@@ -1,13 +1,25 @@
+import copy
+import functools
+import gzip
+import hashlib
+import itertools
 import json
 import os
 import re
+import string
+import sys
 import threading
 import time
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
-from urllib.parse import parse_qs, urlparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from urllib.parse import unquote_plus, urlencode, urlsplit
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 
 import parser as record_parser
 
@@ -21,44 +33,86 @@ except Exception:  # pragma: no cover
 
 JsonObj = Dict[str, Any]
 
+# json.dumps(..., ensure_ascii=False) builds a fresh JSONEncoder per call; reuse them.
+_json_text = json.JSONEncoder(ensure_ascii=False).encode
+_json_pretty = json.JSONEncoder(ensure_ascii=False, indent=2).encode
+
+
+_DOTENV_KEY_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+_DOTENV_FORCE_OVERRIDE = frozenset(
+    {
+        "HEARTSMART_COOKIE_HEADER",
+        "HEARTSMART_URL",
+        "HEARTSMART_API_BASE",
+        "HEARTSMART_REFERER",
+    }
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _read_dotenv_file(dotenv_path: str, mtime: float) -> Tuple[Tuple[str, str, bool], ...]:
+    """
+    Parses a .env file into (key, value, force_override) entries.
+    `mtime` is only part of the cache key so an edited file is re-read.
+    """
+    with open(dotenv_path, "r", encoding="utf-8") as f:
+        buf = f.read()
+
+    if "\r" in buf:
+        buf = buf.replace("\r\n", "\n").replace("\r", "\n")
+
+    # Single pass over the buffer: find line/"=" boundaries instead of splitting lines.
+    entries: List[Tuple[str, str, bool]] = []
+    end = len(buf)
+    pos = 0
+    while pos < end:
+        eol = buf.find("\n", pos)
+        if eol < 0:
+            eol = end
+        eq = buf.find("=", pos, eol)
+        start, pos = pos, eol + 1
+        if eq < 0:
+            continue
+        k = buf[start:eq].strip()
+        if not k or k[0] == "#" or not _DOTENV_KEY_CHARS.issuperset(k):
+            continue
+        v = buf[eq + 1 : eol].strip()
+        if len(v) >= 2 and v[0] == v[-1] and v[0] in ("'", '"'):
+            v = v[1:-1]
+        entries.append((k, v, k in _DOTENV_FORCE_OVERRIDE))
+    return tuple(entries)
+
 
 def _load_dotenv(dotenv_path: str = ".env") -> None:
     """
     Minimal .env loader (no external deps).
     - Supports KEY=value or KEY="value" or KEY='value'
-    - Ignores blank lines and comments
+    - Ignores blank lines, comments and keys that are not [A-Za-z0-9_]
     - For auth/session keys, .env intentionally overrides shell env to avoid stale cookies
+    - Parsed contents are cached per file mtime, so repeated calls do not re-read the file
     """
-    force_override = {
-        "HEARTSMART_COOKIE_HEADER",
-        "HEARTSMART_URL",
-        "HEARTSMART_API_BASE",
-        "HEARTSMART_REFERER",
-    }
     try:
-        with open(dotenv_path, "r", encoding="utf-8") as f:
-            for raw in f:
-                line = raw.strip()
-                if not line or line.startswith("#") or "=" not in line:
-                    continue
-                k, v = line.split("=", 1)
-                k = k.strip()
-                v = v.strip()
-                if not k:
-                    continue
-                if (k in os.environ) and (k not in force_override):
-                    continue
-                if len(v) >= 2 and v[0] == v[-1] and v[0] in ("'", '"'):
-                    v = v[1:-1]
-                os.environ[k] = v
+        mtime = os.path.getmtime(dotenv_path)
+        entries = _read_dotenv_file(dotenv_path, mtime)
     except FileNotFoundError:
         return
 
+    for k, v, force in entries:
+        current = os.environ.get(k)
+        if current is not None and (not force or current == v):
+            continue
+        os.environ[k] = v
+
 
 _load_dotenv()
 
 APP_TITLE = "HeartSmart Copilot"
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+# Spec + notes replies are small; the cap bounds tail latency when the model runs long.
+try:
+    OPENAI_MAX_TOKENS = max(64, int(os.environ.get("OPENAI_MAX_TOKENS", "768")))
+except ValueError:
+    OPENAI_MAX_TOKENS = 768
 HEARTSMART_API_BASE = os.environ.get(
     "HEARTSMART_API_BASE",
     "https://devheartsmart.pcgcid.org/api/v2/freeze-2025-05-06",
@@ -76,52 +130,131 @@ try:
     HEARTSMART_API_TIMEOUT_SEC = max(30, int(os.environ.get("HEARTSMART_API_TIMEOUT_SEC", "180")))
 except ValueError:
     HEARTSMART_API_TIMEOUT_SEC = 180
+try:
+    HEARTSMART_PREVIEW_CONCURRENCY = max(1, int(os.environ.get("HEARTSMART_PREVIEW_CONCURRENCY", "8")))
+except ValueError:
+    HEARTSMART_PREVIEW_CONCURRENCY = 8
+# Speculatively request preview page 2 together with page 1 (see _fetch_preview_all_rows).
+_PREFETCH_ENABLED = os.environ.get("HEARTSMART_PREVIEW_PREFETCH", "1").strip().lower() not in {"0", "false", "no", "off"}
+# Optional on-disk cache of preview pages, revalidated with ETag/Last-Modified. Off when unset,
+# since pages hold subject-level data.
+HEARTSMART_PREVIEW_CACHE_DIR = os.path.expanduser(os.environ.get("HEARTSMART_PREVIEW_CACHE_DIR", "").strip())
 
 
 app = Flask(__name__)
 
 _DATA_CACHE: Optional[JsonObj] = None
 _FIELDS_CACHE: Optional[List[str]] = None
+
+
+class _FieldViews(NamedTuple):
+    """Per-request derivations of a field list, built once per published load."""
+
+    fields: List[str]
+    allowed: FrozenSet[str]
+    preview_text: str
+    prompt_list: str
+
+
+_FIELD_VIEWS: Optional[_FieldViews] = None
 _LOAD_INFO: Optional[Tuple[float, int]] = None  # (seconds, row_count)
 _LOAD_LOCK = threading.Lock()
+# Serializes full loads. _LOAD_LOCK is only held for short state reads/swaps, never across API calls.
+_LOAD_FETCH_LOCK = threading.Lock()
+# Bumped whenever the cache is cleared, so a load started under older settings is not published.
+_LOAD_GENERATION = 0
 _BACKGROUND_LOAD_THREAD: Optional[threading.Thread] = None
 _BACKGROUND_LOAD_STARTED_AT: Optional[float] = None
 _BACKGROUND_LOAD_ERROR: Optional[str] = None
-_RUNTIME_API_BASE = HEARTSMART_API_BASE
-_RUNTIME_PREVIEW_PATH = PREVIEW_ENDPOINT_PATH
-_RUNTIME_PREVIEW_PAGE_SIZE = HEARTSMART_PREVIEW_PAGE_SIZE
-_RUNTIME_REFERER = HEARTSMART_REFERER
-_RUNTIME_COOKIE_HEADER = (os.getenv("HEARTSMART_COOKIE_HEADER", "") or "").strip()
+# Progress of the load in flight; rows of pages received so far are queryable before it finishes.
+_PAGES_LOADED = 0
+_PAGES_TOTAL: Optional[int] = None
+_PARTIAL_ROWS: Optional[List[JsonObj]] = None
+_PARTIAL_ROW_COUNT = 0
+
+
+class RuntimeConfig(NamedTuple):
+    """
+    Immutable snapshot of the live API connection settings.
+    Replaced as a whole (never mutated) so readers can grab `_runtime` once.
+    """
+
+    api_base: str
+    preview_path: str
+    per_page: int
+    referer: str
+    cookie_header: str
+    data_source_label: str
+
+    @classmethod
+    def create(
+        cls,
+        api_base: str,
+        preview_path: str,
+        per_page: int,
+        referer: str,
+        cookie_header: str,
+    ) -> "RuntimeConfig":
+        # The label is rendered on every page, so format it once here.
+        label = f"{api_base}{preview_path}?page=1&records_per_page={per_page}"
+        return cls(api_base, preview_path, per_page, referer, cookie_header, label)
 
 
 def _runtime_data_source_label() -> str:
-    return (
-        f"{_RUNTIME_API_BASE}{_RUNTIME_PREVIEW_PATH}"
-        f"?page=1&records_per_page={_RUNTIME_PREVIEW_PAGE_SIZE}"
-    )
+    return _runtime.data_source_label
 
 
 def _runtime_preview_url_for_form() -> str:
-    return _runtime_data_source_label()
+    return _runtime.data_source_label
 
 
 def _clear_runtime_cache_unlocked() -> None:
-    global _DATA_CACHE, _FIELDS_CACHE, _LOAD_INFO
+    global _DATA_CACHE, _FIELDS_CACHE, _FIELD_VIEWS, _LOAD_INFO, _LOAD_GENERATION
     global _BACKGROUND_LOAD_THREAD, _BACKGROUND_LOAD_STARTED_AT, _BACKGROUND_LOAD_ERROR
     _DATA_CACHE = None
     _FIELDS_CACHE = None
+    _FIELD_VIEWS = None
     _LOAD_INFO = None
+    _LOAD_GENERATION += 1
     _BACKGROUND_LOAD_THREAD = None
     _BACKGROUND_LOAD_STARTED_AT = None
     _BACKGROUND_LOAD_ERROR = None
+    _reset_load_progress_unlocked()
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE.clear()
+    _infer_collection_field_map_cached.cache_clear()
 
 
-def _parse_preview_url_config(preview_url: str) -> Tuple[str, str, int]:
-    raw = (preview_url or "").strip()
-    if not raw:
-        raise ValueError("Preview URL is required.")
+def _reset_load_progress_unlocked() -> None:
+    global _PAGES_LOADED, _PAGES_TOTAL, _PARTIAL_ROWS, _PARTIAL_ROW_COUNT
+    _PAGES_LOADED = 0
+    _PAGES_TOTAL = None
+    _PARTIAL_ROWS = None
+    _PARTIAL_ROW_COUNT = 0
 
-    parsed = urlparse(raw)
+
+def _query_param(query: str, name: str) -> Optional[str]:
+    """
+    First non-blank `name=` value in a raw query string, decoded like parse_qs.
+    """
+    key = name + "="
+    pos = 0
+    while True:
+        idx = query.find(key, pos)
+        if idx < 0:
+            return None
+        if idx == 0 or query[idx - 1] == "&":
+            start = idx + len(key)
+            end = query.find("&", start)
+            value = unquote_plus(query[start:] if end < 0 else query[start:end])
+            if value:
+                return value
+        pos = idx + 1
+
+
+@functools.lru_cache(maxsize=8)
+def _split_preview_url(raw: str) -> Tuple[str, str, Optional[int]]:
+    parsed = urlsplit(raw)
     if not parsed.scheme or not parsed.netloc:
         raise ValueError("Preview URL must include protocol and host.")
 
@@ -140,18 +273,30 @@ def _parse_preview_url_config(preview_url: str) -> Tuple[str, str, int]:
         preview_path += "/"
 
     api_base = f"{parsed.scheme}://{parsed.netloc}{api_path}".rstrip("/")
-    params = parse_qs(parsed.query or "")
-    per_page = _RUNTIME_PREVIEW_PAGE_SIZE
-    raw_per_page = (params.get("records_per_page") or [None])[0]
-    if raw_per_page is not None and str(raw_per_page).strip():
+    per_page: Optional[int] = None
+    raw_per_page = _query_param(parsed.query or "", "records_per_page")
+    if raw_per_page is not None and raw_per_page.strip():
         try:
-            per_page = max(1, int(str(raw_per_page).strip()))
+            per_page = max(1, int(raw_per_page.strip()))
         except ValueError as exc:
             raise ValueError("records_per_page in Preview URL must be a positive integer.") from exc
 
     return api_base, preview_path, per_page
 
 
+def _parse_preview_url_config(preview_url: str) -> Tuple[str, str, int]:
+    raw = (preview_url or "").strip()
+    if not raw:
+        raise ValueError("Preview URL is required.")
+
+    # Re-submitting the same URL (the form echoes it back) hits the cache.
+    api_base, preview_path, per_page = _split_preview_url(raw)
+    return api_base, preview_path, per_page if per_page is not None else _runtime.per_page
+
+
+_COOKIE_SEP_RE = re.compile(r"\s*;\s*")
+
+
 def _normalize_cookie_header(cookie_header_value: str) -> str:
     """
     Accepts raw cookie text pasted from browser/network tools and normalizes it.
@@ -191,40 +336,56 @@ def _normalize_cookie_header(cookie_header_value: str) -> str:
             chosen = chosen.split(":", 1)[1].strip()
 
     chosen = chosen.strip().strip(";")
-    chosen = re.sub(r"\s*;\s*", "; ", chosen)
+    chosen = _COOKIE_SEP_RE.sub("; ", chosen)
     return chosen
 
 
+# cookie_header is always stored normalized, so readers can use it as-is.
+_runtime = RuntimeConfig.create(
+    api_base=HEARTSMART_API_BASE,
+    preview_path=PREVIEW_ENDPOINT_PATH,
+    per_page=HEARTSMART_PREVIEW_PAGE_SIZE,
+    referer=HEARTSMART_REFERER,
+    cookie_header=_normalize_cookie_header(os.getenv("HEARTSMART_COOKIE_HEADER", "")),
+)
+
+
 def _apply_runtime_connection_settings(
     preview_url: str,
     cookie_header: str,
     referer: str,
 ) -> None:
-    global _RUNTIME_API_BASE, _RUNTIME_PREVIEW_PATH, _RUNTIME_PREVIEW_PAGE_SIZE
-    global _RUNTIME_REFERER, _RUNTIME_COOKIE_HEADER
+    global _runtime
 
-    with _LOAD_LOCK:
-        if (preview_url or "").strip():
-            api_base, preview_path, per_page = _parse_preview_url_config(preview_url)
-        else:
-            api_base, preview_path, per_page = _RUNTIME_API_BASE, _RUNTIME_PREVIEW_PATH, _RUNTIME_PREVIEW_PAGE_SIZE
+    # Parse/normalize outside the lock; only the config swap needs to be serialized.
+    parsed_url = _parse_preview_url_config(preview_url) if (preview_url or "").strip() else None
+    given_cookie = _normalize_cookie_header(cookie_header)
+    given_referer = (referer or "").strip()
 
-        next_cookie = _normalize_cookie_header(cookie_header) or _RUNTIME_COOKIE_HEADER
+    with _LOAD_LOCK:
+        cfg = _runtime
+        api_base, preview_path, per_page = parsed_url or (cfg.api_base, cfg.preview_path, cfg.per_page)
+        next_cookie = given_cookie or cfg.cookie_header
         if not next_cookie:
             raise ValueError("Cookie Header is required.")
-        next_referer = (referer or "").strip() or _RUNTIME_REFERER
 
-        _RUNTIME_API_BASE = api_base
-        _RUNTIME_PREVIEW_PATH = preview_path
-        _RUNTIME_PREVIEW_PAGE_SIZE = per_page
-        _RUNTIME_REFERER = next_referer
-        _RUNTIME_COOKIE_HEADER = next_cookie
+        new_cfg = RuntimeConfig.create(
+            api_base=api_base,
+            preview_path=preview_path,
+            per_page=per_page,
+            referer=given_referer or cfg.referer,
+            cookie_header=next_cookie,
+        )
+        _runtime = new_cfg
         _clear_runtime_cache_unlocked()
 
-    os.environ["HEARTSMART_API_BASE"] = _RUNTIME_API_BASE
-    os.environ["HEARTSMART_REFERER"] = _RUNTIME_REFERER
-    os.environ["HEARTSMART_PREVIEW_PAGE_SIZE"] = str(_RUNTIME_PREVIEW_PAGE_SIZE)
-    os.environ["HEARTSMART_COOKIE_HEADER"] = _RUNTIME_COOKIE_HEADER
+    with _SESSION_LOCK:
+        _SESSION_CACHE.clear()
+
+    os.environ["HEARTSMART_API_BASE"] = new_cfg.api_base
+    os.environ["HEARTSMART_REFERER"] = new_cfg.referer
+    os.environ["HEARTSMART_PREVIEW_PAGE_SIZE"] = str(new_cfg.per_page)
+    os.environ["HEARTSMART_COOKIE_HEADER"] = new_cfg.cookie_header
 
 
 INDEX_TEMPLATE = """
@@ -830,61 +991,160 @@ INDEX_TEMPLATE = """
 </html>
 """
 
+# Compiled once; Flask's jinja_env keeps autoescaping on for string templates.
+_INDEX_TEMPLATE = app.jinja_env.from_string(INDEX_TEMPLATE)
+
+
+ALLOWED_OPS: FrozenSet[str] = frozenset(
+    {
+        "exists",
+        "isnull",
+        "eq",
+        "ne",
+        "in",
+        "nin",
+        "contains",
+        "startswith",
+        "endswith",
+        "regex",
+        "gt",
+        "gte",
+        "lt",
+        "lte",
+    }
+)
 
-ALLOWED_OPS: Set[str] = {
-    "exists",
-    "isnull",
-    "eq",
-    "ne",
-    "in",
-    "nin",
-    "contains",
-    "startswith",
-    "endswith",
-    "regex",
-    "gt",
-    "gte",
-    "lt",
-    "lte",
-}
+# Site collections stored column-wise: _SITE_IDS[i], _SITE_NAMES[i] and _SITE_PLURALS[i]
+# describe the same collection.
+_SITE_IDS: Tuple[str, ...] = (
+    "cmri_data",
+    "copy_number_result",
+    "emrdata_cpt",
+    "emrdata_computed_phenotype",
+    "emrdata_echo",
+    "emrdata_ipccc",
+    "emrdata_socialdeprivation",
+    "emrdata_vitals",
+    "emrdata_encounters",
+    "fish_result",
+    "fyler_diagnoses",
+    "genomics_analysis",
+    "genomics_data",
+    "genomics_metadata",
+    "emrdata_hpo",
+    "icd_10_cm",
+    "icd_10_pcs",
+    "icd_9_cm",
+    "icd_9_pcs",
+    "karyotype",
+    "emrdata_labs",
+    "microarray_result",
+    "mutation_result",
+    "other_genetic_test_result",
+    "outcomes_one",
+    "outcomes_over_one",
+    "outcomes_survey",
+    "emrdata_phecode",
+    "pregnancy_birth_history",
+    "emrdata_rxnorm",
+    "sample",
+    "subject",
+)
+_SITE_NAMES: Tuple[str, ...] = (
+    "cmri_data",
+    "Copy Number Result",
+    "CPT",
+    "emrdata_computed_phenotype",
+    "emrdata_echo",
+    "emrdata_ipccc",
+    "emrdata_socialdeprivation",
+    "emrdata_vitals",
+    "Encounters",
+    "Fish Result",
+    "Fyler Diagnoses",
+    "Genomics Analysis",
+    "Genomics Data",
+    "Genomics Metadata",
+    "HPO",
+    "ICD-10-CM",
+    "ICD-10-PCS",
+    "ICD-9-CM",
+    "ICD-9-PCS",
+    "Karyotype",
+    "Labs",
+    "Microarray Result",
+    "Mutation Result",
+    "Other Genetic Test Result",
+    "Outcomes One",
+    "Outcomes Over One",
+    "Outcomes Survey",
+    "Phecode",
+    "Pregnancy Birth History",
+    "RxNorm",
+    "Sample",
+    "Subject",
+)
+_SITE_PLURALS: Tuple[str, ...] = (
+    "cmri_datas",
+    "Copy Number Results",
+    "CPTs",
+    "emrdata_computed_phenotypes",
+    "emrdata_echos",
+    "emrdata_ipcccs",
+    "emrdata_socialdeprivations",
+    "emrdata_vitalss",
+    "Encounterss",
+    "Fish Results",
+    "Fyler Diagnosess",
+    "Genomics Analysiss",
+    "Genomics Datas",
+    "Genomics Metadatas",
+    "HPOs",
+    "ICD-10-CMs",
+    "ICD-10-PCSs",
+    "ICD-9-CMs",
+    "ICD-9-PCSs",
+    "Karyotypes",
+    "Labss",
+    "Microarray Results",
+    "Mutation Results",
+    "Other Genetic Test Results",
+    "Outcomes Ones",
+    "Outcomes Over Ones",
+    "Outcomes Surveys",
+    "Phecodes",
+    "Pregnancy Birth Historys",
+    "RxNorms",
+    "Samples",
+    "Subjects",
+)
+
+
+def _iter_collections() -> Iterator[Tuple[str, str, str]]:
+    """
+    Yields (permanent_id, name, plural) for every site collection.
+    """
+    return zip(_SITE_IDS, _SITE_NAMES, _SITE_PLURALS)
+
+
+_SITE_COLLECTIONS_DICTS: Optional[List[Dict[str, str]]] = None
 
-SITE_COLLECTIONS: List[Dict[str, str]] = [
-    {"permanent_id": "cmri_data", "name": "cmri_data", "plural": "cmri_datas"},
-    {"permanent_id": "copy_number_result", "name": "Copy Number Result", "plural": "Copy Number Results"},
-    {"permanent_id": "emrdata_cpt", "name": "CPT", "plural": "CPTs"},
-    {"permanent_id": "emrdata_computed_phenotype", "name": "emrdata_computed_phenotype", "plural": "emrdata_computed_phenotypes"},
-    {"permanent_id": "emrdata_echo", "name": "emrdata_echo", "plural": "emrdata_echos"},
-    {"permanent_id": "emrdata_ipccc", "name": "emrdata_ipccc", "plural": "emrdata_ipcccs"},
-    {"permanent_id": "emrdata_socialdeprivation", "name": "emrdata_socialdeprivation", "plural": "emrdata_socialdeprivations"},
-    {"permanent_id": "emrdata_vitals", "name": "emrdata_vitals", "plural": "emrdata_vitalss"},
-    {"permanent_id": "emrdata_encounters", "name": "Encounters", "plural": "Encounterss"},
-    {"permanent_id": "fish_result", "name": "Fish Result", "plural": "Fish Results"},
-    {"permanent_id": "fyler_diagnoses", "name": "Fyler Diagnoses", "plural": "Fyler Diagnosess"},
-    {"permanent_id": "genomics_analysis", "name": "Genomics Analysis", "plural": "Genomics Analysiss"},
-    {"permanent_id": "genomics_data", "name": "Genomics Data", "plural": "Genomics Datas"},
-    {"permanent_id": "genomics_metadata", "name": "Genomics Metadata", "plural": "Genomics Metadatas"},
-    {"permanent_id": "emrdata_hpo", "name": "HPO", "plural": "HPOs"},
-    {"permanent_id": "icd_10_cm", "name": "ICD-10-CM", "plural": "ICD-10-CMs"},
-    {"permanent_id": "icd_10_pcs", "name": "ICD-10-PCS", "plural": "ICD-10-PCSs"},
-    {"permanent_id": "icd_9_cm", "name": "ICD-9-CM", "plural": "ICD-9-CMs"},
-    {"permanent_id": "icd_9_pcs", "name": "ICD-9-PCS", "plural": "ICD-9-PCSs"},
-    {"permanent_id": "karyotype", "name": "Karyotype", "plural": "Karyotypes"},
-    {"permanent_id": "emrdata_labs", "name": "Labs", "plural": "Labss"},
-    {"permanent_id": "microarray_result", "name": "Microarray Result", "plural": "Microarray Results"},
-    {"permanent_id": "mutation_result", "name": "Mutation Result", "plural": "Mutation Results"},
-    {"permanent_id": "other_genetic_test_result", "name": "Other Genetic Test Result", "plural": "Other Genetic Test Results"},
-    {"permanent_id": "outcomes_one", "name": "Outcomes One", "plural": "Outcomes Ones"},
-    {"permanent_id": "outcomes_over_one", "name": "Outcomes Over One", "plural": "Outcomes Over Ones"},
-    {"permanent_id": "outcomes_survey", "name": "Outcomes Survey", "plural": "Outcomes Surveys"},
-    {"permanent_id": "emrdata_phecode", "name": "Phecode", "plural": "Phecodes"},
-    {"permanent_id": "pregnancy_birth_history", "name": "Pregnancy Birth History", "plural": "Pregnancy Birth Historys"},
-    {"permanent_id": "emrdata_rxnorm", "name": "RxNorm", "plural": "RxNorms"},
-    {"permanent_id": "sample", "name": "Sample", "plural": "Samples"},
-    {"permanent_id": "subject", "name": "Subject", "plural": "Subjects"},
-]
 
-SITE_COLLECTION_IDS: Set[str] = {c["permanent_id"] for c in SITE_COLLECTIONS}
-SITE_COLLECTION_NAME_BY_ID: Dict[str, str] = {c["permanent_id"]: c["name"] for c in SITE_COLLECTIONS}
+def __getattr__(name: str) -> Any:
+    # Legacy list-of-dicts view (`app.SITE_COLLECTIONS`), built on first access only.
+    global _SITE_COLLECTIONS_DICTS
+    if name == "SITE_COLLECTIONS":
+        if _SITE_COLLECTIONS_DICTS is None:
+            _SITE_COLLECTIONS_DICTS = [
+                {"permanent_id": cid, "name": cname, "plural": plural}
+                for cid, cname, plural in _iter_collections()
+            ]
+        return _SITE_COLLECTIONS_DICTS
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+SITE_COLLECTION_IDS: FrozenSet[str] = frozenset(_SITE_IDS)
+SITE_COLLECTION_NAME_BY_ID: Dict[str, str] = dict(zip(_SITE_IDS, _SITE_NAMES))
 
 # Heuristic mapping from a site collection to matching local flat-row fields.
 COLLECTION_FIELD_HINTS: Dict[str, List[str]] = {
@@ -907,33 +1167,57 @@ COLLECTION_FIELD_HINTS: Dict[str, List[str]] = {
 }
 
 
+_NORMALIZE_RE = re.compile(r"[^a-z0-9]+")
+_PARENS_STRIP_RE = re.compile(r"\([^)]*\)")
+_PARENS_INNER_RE = re.compile(r"\(([^)]+)\)")
+_SPLIT_CONJ_RE = re.compile(r",|;|\band\b|\bor\b", re.IGNORECASE)
+
+
+class _NormalizeTable(dict):
+    """
+    str.translate table: lowercases, keeps [a-z0-9] and maps everything else to a space.
+    Entries are filled lazily per code point, so only characters actually seen are stored.
+    """
+
+    def __missing__(self, codepoint: int) -> str:
+        out = "".join(ch if ("a" <= ch <= "z" or "0" <= ch <= "9") else " " for ch in chr(codepoint).lower())
+        self[codepoint] = out
+        return out
+
+
+_NORMALIZE_TABLE = _NormalizeTable()
+
+
 def _normalize_for_match(text: str) -> str:
-    return re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+    return " ".join((text or "").translate(_NORMALIZE_TABLE).split())
 
 
 def _build_collection_alias_map() -> Dict[str, str]:
     aliases: Dict[str, str] = {}
-    for c in SITE_COLLECTIONS:
-        cid = c["permanent_id"]
-        names = {
-            c["permanent_id"],
-            c["name"],
-            c["plural"],
-            c["permanent_id"].replace("_", " "),
-        }
-        # "subject" as a raw word is too broad for NL parsing, so keep it explicit.
+    norm = _NORMALIZE_RE.sub
+    for cid, cname, plural in _iter_collections():
         if cid == "subject":
-            names |= {"subject collection", "subject records", "root subject"}
-            names.discard("subject")
+            # "subject" as a raw word is too broad for NL parsing, so keep it explicit.
+            names: Tuple[str, ...] = (cname, plural, "subject collection", "subject records", "root subject")
+        else:
+            names = (cid, cname, plural, cid.replace("_", " "))
         for n in names:
-            norm = _normalize_for_match(n)
-            if norm:
-                aliases[norm] = cid
+            key = norm(" ", n.lower()).strip()
+            if key:
+                aliases.setdefault(key, cid)
     return aliases
 
 
 COLLECTION_ALIAS_TO_ID = _build_collection_alias_map()
 
+# One alternation over every alias (longest first) instead of a regex per alias.
+# The match is a lookahead so overlapping mentions are all reported.
+_COLLECTION_ALIAS_RE = re.compile(
+    r"(?<!\S)(?=("
+    + "|".join(re.escape(a) for a in sorted(COLLECTION_ALIAS_TO_ID, key=len, reverse=True))
+    + r")(?!\S))"
+)
+
 
 def extract_collection_filters_from_text(nl_query: str) -> List[str]:
     """
@@ -943,10 +1227,7 @@ def extract_collection_filters_from_text(nl_query: str) -> List[str]:
     if not q:
         return []
 
-    found: Set[str] = set()
-    for alias, cid in COLLECTION_ALIAS_TO_ID.items():
-        if re.search(rf"(^|\s){re.escape(alias)}(\s|$)", q):
-            found.add(cid)
+    found = {COLLECTION_ALIAS_TO_ID[m.group(1)] for m in _COLLECTION_ALIAS_RE.finditer(q)}
     return sorted(found)
 
 
@@ -959,10 +1240,10 @@ def _resolve_collection_id(value: str) -> Optional[str]:
         return raw
 
     candidates: List[str] = [raw]
-    without_parens = re.sub(r"\([^)]*\)", " ", raw).strip()
+    without_parens = _PARENS_STRIP_RE.sub(" ", raw).strip()
     if without_parens and without_parens not in candidates:
         candidates.append(without_parens)
-    for inner in re.findall(r"\(([^)]+)\)", raw):
+    for inner in _PARENS_INNER_RE.findall(raw):
         inner = inner.strip()
         if inner and inner not in candidates:
             candidates.append(inner)
@@ -988,9 +1269,13 @@ def normalize_collection_list(raw_collections: Any) -> List[str]:
     else:
         return []
 
+    # Common LLM path: already clean permanent IDs, nothing to split or resolve.
+    if all(i in SITE_COLLECTION_IDS for i in items):
+        return sorted(set(items))
+
     out: Set[str] = set()
     for item in items:
-        parts = re.split(r",|;|\band\b|\bor\b", item, flags=re.IGNORECASE)
+        parts = _SPLIT_CONJ_RE.split(item)
         for part in parts:
             cid = _resolve_collection_id(part)
             if cid:
@@ -998,37 +1283,390 @@ def normalize_collection_list(raw_collections: Any) -> List[str]:
     return sorted(out)
 
 
+def _always_true(_: Any) -> bool:
+    return True
+
+
+# Exact-type dispatch for the common JSON value types; called per (row, field).
+_MEANINGFUL_BY_TYPE: Dict[type, Callable[[Any], bool]] = {
+    str: lambda v: bool(v) and not v.isspace(),
+    type(None): lambda v: False,
+    # bool/int/float are considered meaningful if present.
+    bool: _always_true,
+    int: _always_true,
+    float: _always_true,
+    list: bool,
+    dict: bool,
+    tuple: bool,
+    set: bool,
+}
+
+
 def _is_meaningful_value(v: Any) -> bool:
-    if v is None:
-        return False
+    fn = _MEANINGFUL_BY_TYPE.get(type(v))
+    if fn is not None:
+        return fn(v)
+    # Subclasses and other types fall back to the isinstance checks.
     if isinstance(v, str):
         return bool(v.strip())
     if isinstance(v, (list, dict, tuple, set)):
         return len(v) > 0
-    # bool/int/float are considered meaningful if present.
     return True
 
 
+def _field_truthy_mask(column: List[Any]) -> bytes:
+    """
+    One byte per row: 1 when the column cell holds a meaningful value, else 0.
+    """
+    return bytes(map(_is_meaningful_value, column))
+
+
+def _data_column(data: JsonObj, field: str) -> List[Any]:
+    """
+    Column view (one cell per row) of a loaded dataset. Preview loads fill these
+    up front; any other field is built on first use.
+    Stored on the data dict itself so it is dropped together with that load.
+    """
+    columns: Dict[str, List[Any]] = data.setdefault("columns", {})
+    col = columns.get(field)
+    if col is None:
+        col = [r.get(field) for r in data.get("rows_as_objects", [])]
+        columns[field] = col
+    return col
+
+
+# Cheapest leaf tests first inside an "and": later children only see rows still alive.
+# Nested nodes rank after every leaf op.
+_SPEC_SUBTREE_COST = max(record_parser.OP_COST.values()) + 1
+
+
+def _spec_child_cost(child: Any) -> int:
+    if not isinstance(child, dict) or "and" in child or "or" in child or "not" in child:
+        return _SPEC_SUBTREE_COST
+    return record_parser.OP_COST.get(child.get("op", "eq"), _SPEC_SUBTREE_COST)
+
+
+# 0.0 and -0.0 are equal keys but stringify differently (e.g. for "contains"), so cell
+# memos give them distinct keys; the value stays at key[1].
+_SIGNED_ZERO_KEYS: Dict[str, Tuple[Any, ...]] = {"0.0": (float, 0.0), "-0.0": (float, -0.0, "-")}
+
+# Columns with at most this many distinct cells get a row mask per value (see below).
+# Each mask is one byte per row, so this also bounds the memory per indexed column.
+_VALUE_MASK_MAX_VALUES = 16
+
+
+def _data_value_masks(data: JsonObj, field: str) -> Optional[Dict[Tuple[Any, ...], int]]:
+    """
+    Row mask per distinct cell value of a low-cardinality column, keyed by (type, value),
+    so a leaf test runs once per category and its rows are OR-ed in without a row scan.
+    None when the column has too many distinct or unhashable values. Cached like columns.
+    """
+    cache: Dict[str, Optional[Dict[Tuple[Any, ...], int]]] = data.setdefault("value_masks", {})
+    if field in cache:
+        return cache[field]
+    column = _data_column(data, field)
+    n = len(column)
+    positions: Dict[Tuple[Any, ...], bytearray] = {}
+    result: Optional[Dict[Tuple[Any, ...], int]] = None
+    try:
+        for i, value in enumerate(column):
+            key = (value.__class__, value)
+            if value.__class__ is float and not value:
+                key = _SIGNED_ZERO_KEYS[str(value)]
+            buf = positions.get(key)
+            if buf is None:
+                if len(positions) >= _VALUE_MASK_MAX_VALUES:
+                    break
+                buf = positions[key] = bytearray(n)
+            buf[i] = 1
+        else:
+            result = {key: int.from_bytes(buf, "little") for key, buf in positions.items()}
+    except TypeError:
+        pass
+    cache[field] = result
+    return result
+
+
+def _data_number_column(data: JsonObj, field: str) -> List[Optional[float]]:
+    """
+    record_parser.coerce_number applied to every cell of a column, for gt/gte/lt/lte
+    leaves on fields with many distinct values (ages, counts). Cached like columns.
+    """
+    cache: Dict[str, List[Optional[float]]] = data.setdefault("numbers", {})
+    numbers = cache.get(field)
+    if numbers is None:
+        coerce_number = record_parser.coerce_number
+        seen: Dict[Tuple[type, Any], Optional[float]] = {}
+        numbers = []
+        for value in _data_column(data, field):
+            key = (value.__class__, value)
+            try:
+                if key in seen:
+                    numbers.append(seen[key])
+                    continue
+                number = seen[key] = coerce_number(value)
+            except TypeError:
+                number = coerce_number(value)
+            numbers.append(number)
+        cache[field] = numbers
+    return numbers
+
+
+def _data_text_index(data: JsonObj, field: str) -> Optional[Dict[str, List[int]]]:
+    """
+    Row positions per normalized (stripped, lowercased) string cell of a column, for
+    eq/in lookups on high-cardinality fields such as subject IDs. None when the
+    column holds str subclasses. Cached like columns.
+    """
+    cache: Dict[str, Optional[Dict[str, List[int]]]] = data.setdefault("text_index", {})
+    if field in cache:
+        return cache[field]
+    index: Optional[Dict[str, List[int]]] = {}
+    for i, value in enumerate(_data_column(data, field)):
+        if type(value) is str:
+            index.setdefault(value.strip().lower(), []).append(i)  # type: ignore[union-attr]
+        elif isinstance(value, str):
+            index = None
+            break
+    cache[field] = index
+    return index
+
+
+def _text_index_keys(cond: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Normalized lookup keys when an eq/in leaf can be answered from _data_text_index:
+    every expected value is a string that is not a gender token, so (as record_parser's
+    eq/in define it) only string cells with the same normalized text match.
+    """
+    op = cond.get("op", "eq")
+    expected = cond.get("value", None)
+    if op == "eq":
+        values = [expected]
+    elif op == "in" and isinstance(expected, list):
+        values = expected
+    else:
+        return None
+    keys: List[str] = []
+    for v in values:
+        if type(v) is not str or record_parser.canonical_gender_token(v) is not None:
+            return None
+        keys.append(v.strip().lower())
+    return keys
+
+
+def _spec_leaf_mask(column: List[Any], test_cell: Callable[[Any], bool], live: int, ones: int) -> int:
+    """
+    Row mask (one 0/1 byte per row, as an int) for a leaf predicate, limited to `live` rows.
+    Columns hold few distinct values, so each is tested once and the answer reused.
+    """
+    seen: Dict[Tuple[Any, ...], bool] = {}
+
+    def test(value: Any) -> bool:
+        # Keyed with the type so True/1/1.0 (equal hashes) keep their own answers.
+        key = (value.__class__, value)
+        if value.__class__ is float and not value:
+            key = _SIGNED_ZERO_KEYS[str(value)]
+        try:
+            hit = seen.get(key)
+        except TypeError:
+            return test_cell(value)
+        if hit is None:
+            hit = seen[key] = test_cell(value)
+        return hit
+
+    n = len(column)
+    if live == ones:
+        return int.from_bytes(bytes(map(test, column)), "little")
+    if live.bit_count() * 4 >= n:
+        return int.from_bytes(bytes(map(test, column)), "little") & live
+    # Few rows left: test only those.
+    out = bytearray(n)
+    idx = list(itertools.compress(range(n), live.to_bytes(n, "little")))
+    for i, hit in zip(idx, map(test, map(column.__getitem__, idx))):
+        if hit:
+            out[i] = 1
+    return int.from_bytes(out, "little")
+
+
+class _SpecPlan(NamedTuple):
+    """
+    A spec compiled for column-wise evaluation. `op` is "and"/"or"/"not" (with
+    `children`, "and" ones cheapest first) or "leaf" (with the field, its cell
+    predicate and, when the text index can answer it, the lookup keys).
+    """
+
+    op: str
+    children: Tuple["_SpecPlan", ...] = ()
+    field: str = ""
+    test_cell: Optional[Callable[[Any], bool]] = None
+    text_keys: Optional[List[str]] = None
+    # Numeric comparison leaves: the bound is coerce_number(value), None if it has none.
+    compare: Optional[Callable[[float, float], bool]] = None
+    bound: Optional[float] = None
+
+
+def _build_spec_plan(spec: Dict[str, Any]) -> _SpecPlan:
+    if "and" in spec:
+        return _SpecPlan("and", tuple(_build_spec_plan(c) for c in sorted(spec["and"], key=_spec_child_cost)))
+    if "or" in spec:
+        return _SpecPlan("or", tuple(_build_spec_plan(c) for c in spec["or"]))
+    if "not" in spec:
+        return _SpecPlan("not", (_build_spec_plan(spec["not"]),))
+    compare = record_parser.NUMERIC_COMPARE.get(spec.get("op", "eq"))
+    return _SpecPlan(
+        "leaf",
+        field=spec["field"],
+        test_cell=record_parser.compile_condition(spec),
+        text_keys=_text_index_keys(spec),
+        compare=compare,
+        bound=record_parser.coerce_number(spec.get("value", None)) if compare is not None else None,
+    )
+
+
+# Canonical spec text: equal specs (e.g. from paraphrased questions) share one plan.
+_spec_plan_key = json.JSONEncoder(ensure_ascii=False, sort_keys=True).encode
+_SPEC_PLAN_CACHE_MAX_ENTRIES = 256
+_SPEC_PLAN_CACHE_LOCK = threading.Lock()
+_SPEC_PLAN_CACHE: "OrderedDict[str, _SpecPlan]" = OrderedDict()
+
+
+def _compiled_spec_plan(spec: Dict[str, Any]) -> _SpecPlan:
+    key = _spec_plan_key(spec)
+    with _SPEC_PLAN_CACHE_LOCK:
+        plan = _SPEC_PLAN_CACHE.get(key)
+        if plan is not None:
+            _SPEC_PLAN_CACHE.move_to_end(key)
+            return plan
+    # Built from a private copy so the plan never aliases a caller's spec.
+    plan = _build_spec_plan(copy.deepcopy(spec))
+    with _SPEC_PLAN_CACHE_LOCK:
+        _SPEC_PLAN_CACHE[key] = plan
+        while len(_SPEC_PLAN_CACHE) > _SPEC_PLAN_CACHE_MAX_ENTRIES:
+            _SPEC_PLAN_CACHE.popitem(last=False)
+    return plan
+
+
+def _spec_plan_mask(data: JsonObj, plan: _SpecPlan, live: int, ones: int) -> int:
+    """
+    Mask of the `live` rows matching `plan`; rows outside `live` are never set.
+    """
+    op = plan.op
+    if op == "and":
+        mask = live
+        for child in plan.children:
+            if not mask:
+                break
+            mask = _spec_plan_mask(data, child, mask, ones)
+        return mask
+    if op == "or":
+        mask = 0
+        rest = live
+        for child in plan.children:
+            if not rest:
+                break
+            hit = _spec_plan_mask(data, child, rest, ones)
+            mask |= hit
+            rest ^= hit
+        return mask
+    if op == "not":
+        return live ^ _spec_plan_mask(data, plan.children[0], live, ones)
+
+    field = plan.field
+    test_cell = plan.test_cell
+    assert test_cell is not None
+    if "." in field:
+        # Dotted names are nested paths for the parser, not flat keys.
+        column = [record_parser.get_by_path(r, field) for r in data["rows_as_objects"]]
+        return _spec_leaf_mask(column, test_cell, live, ones)
+    value_masks = _data_value_masks(data, field)
+    if value_masks is None and plan.compare is not None:
+        bound = plan.bound
+        if bound is None:
+            return 0
+        compare = plan.compare
+        numbers = _data_number_column(data, field)
+        return int.from_bytes(bytes(map(lambda a: a is not None and compare(a, bound), numbers)), "little") & live
+    if value_masks is None:
+        keys = plan.text_keys
+        index = _data_text_index(data, field) if keys is not None else None
+        if keys is None or index is None:
+            return _spec_leaf_mask(_data_column(data, field), test_cell, live, ones)
+        # Hash lookup instead of a column scan (e.g. "look up subject X").
+        out = bytearray(len(data["rows_as_objects"]))
+        for key in keys:
+            for i in index.get(key, ()):
+                out[i] = 1
+        return int.from_bytes(out, "little") & live
+    mask = 0
+    for value_key, rows in value_masks.items():
+        if test_cell(value_key[1]):
+            mask |= rows
+    return mask & live
+
+
+def filter_loaded_rows(data: JsonObj, spec: Dict[str, Any]) -> List[JsonObj]:
+    """
+    Same result as record_parser.filter_rows(data, spec), evaluated a column at a
+    time over the dataset's column views instead of walking the spec per row.
+    """
+    rows = data.get("rows_as_objects", [])
+    if not isinstance(rows, list) or not all(type(r) is dict for r in rows):
+        return record_parser.filter_rows(data, spec)
+    if not rows:
+        return []
+    plan = _compiled_spec_plan(spec)
+    n = len(rows)
+    ones = int.from_bytes(b"\x01" * n, "little")
+    mask = _spec_plan_mask(data, plan, ones, ones)
+    return list(itertools.compress(rows, mask.to_bytes(n, "little")))
+
+
 def infer_collection_field_map(fields: List[str]) -> Dict[str, List[str]]:
-    out: Dict[str, List[str]] = {}
-    lowered = [(f, f.lower()) for f in fields]
+    cached = _infer_collection_field_map_cached(tuple(fields))
+    return {cid: list(matches) for cid, matches in cached.items()}
+
+
+def _build_field_hint_index() -> Dict[str, FrozenSet[str]]:
+    # hint -> every collection whose hints occur inside it (a hint matches its own substrings too).
+    cids_by_hint: Dict[str, Set[str]] = {}
     for cid, hints in COLLECTION_FIELD_HINTS.items():
-        matches: List[str] = []
-        for f, lf in lowered:
-            if any(h in lf for h in hints):
-                matches.append(f)
-        if matches:
-            out[cid] = sorted(set(matches))
-    return out
+        for h in hints:
+            cids_by_hint.setdefault(h, set()).add(cid)
+    return {
+        h: frozenset(cid for other, cids in cids_by_hint.items() if other in h for cid in cids)
+        for h in cids_by_hint
+    }
+
+
+_FIELD_HINT_CIDS = _build_field_hint_index()
+# Lookahead at every position so overlapping hints are all seen in one scan per field.
+_FIELD_HINT_RE = re.compile(
+    "(?=(" + "|".join(re.escape(h) for h in sorted(_FIELD_HINT_CIDS, key=len, reverse=True)) + "))"
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _infer_collection_field_map_cached(fields: Tuple[str, ...]) -> Dict[str, Tuple[str, ...]]:
+    # Field lists only change on data reload, so memoize per distinct field tuple.
+    matched: Dict[str, Set[str]] = {}
+    for f in fields:
+        cids: Set[str] = set()
+        for m in _FIELD_HINT_RE.finditer(f.lower()):
+            cids |= _FIELD_HINT_CIDS[m.group(1)]
+        for cid in cids:
+            matched.setdefault(cid, set()).add(f)
+    return {cid: tuple(sorted(matched[cid])) for cid in COLLECTION_FIELD_HINTS if cid in matched}
 
 
 def apply_collection_filters(
     rows: List[JsonObj],
     requested_collections: List[str],
     fields: List[str],
+    column: Optional[Callable[[str], List[Any]]] = None,
 ) -> Tuple[List[JsonObj], List[str], List[str]]:
     """
-    Applies collection filters on top of the parser spec match.
+    Applies heuristic collection filters to rows.
+    `column(field)` may supply precomputed per-field cell lists aligned with `rows`.
     Returns: (filtered_rows, applied_collections, unavailable_collections)
     """
     requested = [c for c in requested_collections if c in SITE_COLLECTION_IDS]
@@ -1048,40 +1686,99 @@ def apply_collection_filters(
     if not available:
         return rows, [], unavailable
 
-    def row_matches_collection(row: JsonObj, cid: str) -> bool:
-        keys = field_map.get(cid, [])
-        return any(_is_meaningful_value(row.get(k)) for k in keys)
+    # OR together one truthiness mask per hinted field (shared hints are scanned once),
+    # then let itertools.compress pick the surviving rows.
+    if column is None:
+
+        def column(field: str) -> List[Any]:
+            return [r.get(field) for r in rows]
 
-    filtered = [r for r in rows if any(row_matches_collection(r, cid) for cid in available)]
+    hinted_fields = sorted({f for cid in available for f in field_map[cid]})
+    combined = 0
+    for f in hinted_fields:
+        combined |= int.from_bytes(_field_truthy_mask(column(f)), "little")
+    mask = combined.to_bytes(len(rows), "little")
+    filtered = list(itertools.compress(rows, mask))
     return filtered, available, unavailable
 
 
 def _parse_cookie_header(cookie_header_value: str) -> Dict[str, str]:
     cookies: Dict[str, str] = {}
-    for part in _normalize_cookie_header(cookie_header_value).split(";"):
-        part = part.strip()
-        if not part or "=" not in part:
-            continue
-        k, v = part.split("=", 1)
-        k = k.strip()
-        v = v.strip()
-        if k:
-            cookies[k] = v
+    header = _normalize_cookie_header(cookie_header_value)
+    end = len(header)
+    pos = 0
+    # Walk ";"/"=" boundaries in place instead of splitting into intermediate lists.
+    while pos < end:
+        semi = header.find(";", pos)
+        if semi < 0:
+            semi = end
+        eq = header.find("=", pos, semi)
+        if eq >= 0:
+            k = header[pos:eq].strip()
+            if k:
+                cookies[k] = header[eq + 1 : semi].strip()
+        pos = semi + 1
     return cookies
 
 
-def _heartsmart_session() -> requests.Session:
-    cookie_header = _normalize_cookie_header(_RUNTIME_COOKIE_HEADER)
-    cookies = _parse_cookie_header(cookie_header)
+_SESSION_LOCK = threading.Lock()
+# Pooled sessions keyed by the RuntimeConfig they were built for; cleared on settings updates.
+_SESSION_CACHE: Dict[RuntimeConfig, requests.Session] = {}
+
+
+def _heartsmart_session(cfg: Optional[RuntimeConfig] = None) -> requests.Session:
+    """
+    Returns the shared session for `cfg` (default: the current runtime config), so TCP/TLS
+    connections are reused across page fetches and queries.
+    """
+    if cfg is None:
+        cfg = _runtime
+    with _SESSION_LOCK:
+        s = _SESSION_CACHE.get(cfg)
+        if s is None:
+            s = _build_heartsmart_session(cfg)
+            _SESSION_CACHE.clear()
+            _SESSION_CACHE[cfg] = s
+        return s
+
+
+@functools.lru_cache(maxsize=4)
+def _session_cookies(cookie_header: str) -> Tuple[Tuple[str, str], ...]:
+    # Settings updates that keep the same cookie (URL/referer only) reuse the parse.
+    return tuple(_parse_cookie_header(cookie_header).items())
+
+
+def _build_heartsmart_session(cfg: RuntimeConfig) -> requests.Session:
+    cookie_header = cfg.cookie_header
+    cookies = dict(_session_cookies(cookie_header))
     if not cookies and "=" not in cookie_header:
         raise RuntimeError("HEARTSMART_COOKIE_HEADER is missing; cannot call live HeartSmart API.")
 
     s = requests.Session()
+    # Transient gateway/rate-limit errors are retried for reads only: cohort_def POSTs
+    # change server-side state and must not be replayed blindly.
+    retry = Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(32, HEARTSMART_PREVIEW_CONCURRENCY),
+        max_retries=retry,
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     s.headers.update(
         {
             "Accept": "application/json",
+            # The same codec list requests sends by default (gzip/deflate, plus br/zstd when
+            # brotli/zstandard are installed); pinned so compressed pages stay requested.
+            "Accept-Encoding": ACCEPT_ENCODING,
             "Content-Type": "application/json",
-            "Referer": _RUNTIME_REFERER,
+            "Referer": cfg.referer,
             "User-Agent": (
                 "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
                 "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36"
@@ -1094,36 +1791,124 @@ def _heartsmart_session() -> requests.Session:
     return s
 
 
-def _api_get(session: requests.Session, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    url = f"{_RUNTIME_API_BASE}{path}"
-    r = session.get(url, params=params, timeout=HEARTSMART_API_TIMEOUT_SEC)
+def _response_json(r: requests.Response) -> Any:
+    # Decode the raw body directly; r.json() first builds the full text copy of the payload.
+    return json.loads(r.content)
+
+
+def _preview_cache_file(url: str, params: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not HEARTSMART_PREVIEW_CACHE_DIR:
+        return None
+    key = url + "?" + urlencode(sorted((params or {}).items()))
+    return os.path.join(HEARTSMART_PREVIEW_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json.gz")
+
+
+def _read_preview_cache(cache_file: str) -> Optional[Tuple[Dict[str, str], bytes]]:
+    """
+    Returns (conditional request headers, cached body) for a stored page, if any.
+    """
+    try:
+        with gzip.open(cache_file, "rb") as f:
+            header_line = f.readline()
+            body = f.read()
+        validators = json.loads(header_line)
+    except (OSError, EOFError, ValueError):
+        return None
+    headers: Dict[str, str] = {}
+    if isinstance(validators, dict):
+        if validators.get("etag"):
+            headers["If-None-Match"] = str(validators["etag"])
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = str(validators["last_modified"])
+    if not headers:
+        return None
+    return headers, body
+
+
+def _write_preview_cache(cache_file: str, r: requests.Response) -> None:
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+    header_line = json.dumps({"etag": etag, "last_modified": last_modified}).encode("utf-8")
+    tmp = f"{cache_file}.{threading.get_ident()}.tmp"
+    try:
+        # Pages hold subject-level rows: keep the directory and files private to this user.
+        os.makedirs(os.path.dirname(cache_file), mode=0o700, exist_ok=True)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        # Page bodies repeat the same field names and values row after row; a fast
+        # gzip level shrinks them several-fold for little CPU.
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wb", compresslevel=3) as f:
+            f.write(header_line + b"\n")
+            f.write(r.content)
+        os.replace(tmp, cache_file)
+    except OSError:
+        # The cache is an optimization only; a failed write just means a full fetch next time.
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _api_get(
+    session: requests.Session,
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    disk_cache: bool = False,
+    cfg: Optional[RuntimeConfig] = None,
+) -> Dict[str, Any]:
+    """
+    GET a JSON endpoint. With `disk_cache` (and HEARTSMART_PREVIEW_CACHE_DIR set) the body is
+    stored on disk and later requests are made conditional, reusing it on 304 Not Modified.
+    `cfg` (default: the current runtime config) supplies the host and auth; multi-call
+    operations pass the one they started with so a settings change cannot split them.
+    """
+    if cfg is None:
+        cfg = _runtime
+    url = f"{cfg.api_base}{path}"
+    cache_file = _preview_cache_file(url, params) if disk_cache else None
+    cached = _read_preview_cache(cache_file) if cache_file else None
+    cond_headers = cached[0] if cached else {}
+    r = session.get(url, params=params, timeout=HEARTSMART_API_TIMEOUT_SEC, headers=cond_headers or None)
     if r.status_code in {401, 403}:
-        raw_cookie = _normalize_cookie_header(_RUNTIME_COOKIE_HEADER)
+        raw_cookie = cfg.cookie_header
         if raw_cookie:
             r = session.get(
                 url,
                 params=params,
                 timeout=HEARTSMART_API_TIMEOUT_SEC,
-                headers={"Cookie": raw_cookie, "Referer": _RUNTIME_REFERER},
+                headers={"Cookie": raw_cookie, "Referer": cfg.referer, **cond_headers},
             )
+    if r.status_code == 304 and cached is not None:
+        return json.loads(cached[1])
     r.raise_for_status()
-    return r.json()
+    if cache_file:
+        _write_preview_cache(cache_file, r)
+    return _response_json(r)
 
 
-def _api_post(session: requests.Session, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    url = f"{_RUNTIME_API_BASE}{path}"
+def _api_post(
+    session: requests.Session,
+    path: str,
+    payload: Dict[str, Any],
+    cfg: Optional[RuntimeConfig] = None,
+) -> Dict[str, Any]:
+    # `cfg` as for _api_get.
+    if cfg is None:
+        cfg = _runtime
+    url = f"{cfg.api_base}{path}"
     r = session.post(url, json=payload, timeout=HEARTSMART_API_TIMEOUT_SEC)
     if r.status_code in {401, 403}:
-        raw_cookie = _normalize_cookie_header(_RUNTIME_COOKIE_HEADER)
+        raw_cookie = cfg.cookie_header
         if raw_cookie:
             r = session.post(
                 url,
                 json=payload,
                 timeout=HEARTSMART_API_TIMEOUT_SEC,
-                headers={"Cookie": raw_cookie, "Referer": _RUNTIME_REFERER},
+                headers={"Cookie": raw_cookie, "Referer": cfg.referer},
             )
     r.raise_for_status()
-    return r.json()
+    return _response_json(r)
 
 
 def _is_auth_error(exc: Exception) -> bool:
@@ -1135,39 +1920,154 @@ def _is_auth_error(exc: Exception) -> bool:
     return ("unauthorized" in text) or ("forbidden" in text) or ("401" in text) or ("403" in text)
 
 
-def _preview_payload_to_rows(payload: Dict[str, Any]) -> List[JsonObj]:
+# last_page seen per (api_base, preview_path, records_per_page, scoped); decides whether to
+# prefetch page 2. Cohort-scoped previews are usually one page, so they keep their own hint
+# rather than switching the full load's prefetch off.
+_LAST_PAGE_HINTS: Dict[Tuple[str, str, int, bool], int] = {}
+
+
+def _preview_payload_keys(payload: Dict[str, Any]) -> List[str]:
     fields = payload.get("extended_table_def", {}).get("fields", [])
-    rows = payload.get("data", [])
     keys: List[str] = []
     for f in fields:
         if isinstance(f, dict):
-            key = f.get("concept_name") or f.get("label") or f.get("entry_id")
-            keys.append(key)
-    out: List[JsonObj] = []
-    for row in rows:
-        if not isinstance(row, list):
-            continue
-        obj = {keys[i]: row[i] for i in range(min(len(keys), len(row)))}
-        out.append(obj)
-    return out
+            key: Any = f.get("concept_name") or f.get("label") or f.get("entry_id")
+            # Every row dict shares these key objects; interning lets lookups with the
+            # module's field-name constants hit the identity fast path.
+            keys.append(sys.intern(key) if type(key) is str else key)
+    return keys
+
+
+def _share_preview_cells(payload: Dict[str, Any], cells: Dict[str, str]) -> None:
+    """
+    Rewrites the payload's raw rows in place so equal string cells are one object.
+    The JSON decoder allocates a new string per cell; categorical fields repeat a few
+    values across every row, and both the row dicts and the column views hold them.
+    """
+    share = cells.setdefault
+    data = payload.get("data")
+    if not isinstance(data, list):
+        return
+    for i, row in enumerate(data):
+        if isinstance(row, list):
+            data[i] = [share(v, v) if type(v) is str else v for v in row]
+
+
+def _preview_payload_to_rows(payload: Dict[str, Any]) -> List[JsonObj]:
+    keys = _preview_payload_keys(payload)
+    rows = payload.get("data", [])
+    # zip stops at the shorter of keys/row, so ragged rows keep only the cells they have.
+    return [dict(zip(keys, row)) for row in rows if isinstance(row, list)]
+
+
+def _extend_preview_columns(
+    columns: Dict[str, List[Any]],
+    payload: Dict[str, Any],
+    page_rows: List[JsonObj],
+    n_before: int,
+) -> None:
+    """
+    Appends one preview page to per-field column lists (one cell per row, None when absent).
+    `page_rows` are the row dicts already built for the same payload; `n_before` is the
+    number of rows the columns already hold.
+    """
+    keys = _preview_payload_keys(payload)
+    width = len(keys)
+    raw = [row for row in payload.get("data", []) if isinstance(row, list)]
+
+    page: Dict[str, List[Any]] = {}
+    if width and raw and all(len(row) >= width for row in raw):
+        # Rectangular page: transpose the raw lists in C instead of reading back every dict.
+        # Duplicate keys keep the last position, like the row dicts do.
+        for k, cells in zip(keys, zip(*raw)):
+            page[k] = list(cells)
+    else:
+        for k in keys:
+            page[k] = [r.get(k) for r in page_rows]
+
+    n_after = n_before + len(page_rows)
+    for k, col in page.items():
+        dst = columns.get(k)
+        if dst is None:
+            dst = columns[k] = [None] * n_before
+        dst.extend(col)
+    for dst in columns.values():
+        if len(dst) < n_after:
+            dst.extend([None] * (n_after - len(dst)))
 
 
 def _fetch_preview_all_rows(
     session: requests.Session,
     per_page: Optional[int] = None,
-) -> Tuple[List[JsonObj], Dict[str, Any]]:
-    fetch_page_size = per_page if isinstance(per_page, int) and per_page > 0 else _RUNTIME_PREVIEW_PAGE_SIZE
-    first = _api_get(session, _RUNTIME_PREVIEW_PATH, params={"page": 1, "records_per_page": fetch_page_size})
-    all_rows = _preview_payload_to_rows(first)
-
-    paginator = first.get("paginator", {}) if isinstance(first.get("paginator"), dict) else {}
-    last_page = paginator.get("last_page", 1)
-    if not isinstance(last_page, int) or last_page < 1:
-        last_page = 1
+    columns: Optional[Dict[str, List[Any]]] = None,
+    disk_cache: bool = False,
+    on_page: Optional[Callable[[List[JsonObj], int, int], None]] = None,
+    scoped: bool = False,
+    cfg: Optional[RuntimeConfig] = None,
+) -> Tuple[List[JsonObj], Dict[str, Any], List[str]]:
+    """
+    Fetches every preview page. Returns (rows, meta, field_names), where field_names are
+    the column names declared by the first page's extended_table_def.
+    When `columns` is given it is filled with column views aligned with the returned rows.
+    `disk_cache` is passed to _api_get; only use it while no cohort criteria are applied.
+    `on_page(rows_so_far, pages_loaded, last_page)` is called after each page is appended.
+    `scoped` marks a preview filtered by cohort criteria (see _LAST_PAGE_HINTS).
+    Every page is fetched with the same `cfg` (default: the current runtime config).
+    """
+    if cfg is None:
+        cfg = _runtime
+    fetch_page_size = per_page if isinstance(per_page, int) and per_page > 0 else cfg.per_page
+    hint_key = (cfg.api_base, cfg.preview_path, fetch_page_size, scoped)
+
+    def fetch_page(page: int) -> Dict[str, Any]:
+        return _api_get(
+            session,
+            cfg.preview_path,
+            params={"page": page, "records_per_page": fetch_page_size},
+            disk_cache=disk_cache,
+            cfg=cfg,
+        )
 
-    for page in range(2, last_page + 1):
-        nxt = _api_get(session, _RUNTIME_PREVIEW_PATH, params={"page": page, "records_per_page": fetch_page_size})
-        all_rows.extend(_preview_payload_to_rows(nxt))
+    # One string object per distinct cell value across the whole load.
+    cells: Dict[str, str] = {}
+    pool = ThreadPoolExecutor(max_workers=HEARTSMART_PREVIEW_CONCURRENCY, thread_name_prefix="heartsmart-preview")
+    try:
+        # Page 1 carries last_page; when this preview needed several pages last time, request
+        # page 2 alongside it instead of after it. The probe is dropped if there is no page 2.
+        probe = None
+        if _PREFETCH_ENABLED and _LAST_PAGE_HINTS.get(hint_key, 1) > 1:
+            probe = pool.submit(fetch_page, 2)
+
+        first = fetch_page(1)
+        _share_preview_cells(first, cells)
+        all_rows = _preview_payload_to_rows(first)
+        if columns is not None:
+            _extend_preview_columns(columns, first, all_rows, 0)
+
+        paginator = first.get("paginator", {}) if isinstance(first.get("paginator"), dict) else {}
+        last_page = paginator.get("last_page", 1)
+        if not isinstance(last_page, int) or last_page < 1:
+            last_page = 1
+        _LAST_PAGE_HINTS[hint_key] = last_page
+        if on_page is not None:
+            on_page(all_rows, 1, last_page)
+
+        # Remaining pages are I/O bound; fetch them concurrently and append in page order.
+        if last_page > 1:
+            futures = [probe if probe is not None else pool.submit(fetch_page, 2)]
+            futures.extend(pool.submit(fetch_page, page) for page in range(3, last_page + 1))
+            for page, fut in enumerate(futures, start=2):
+                nxt = fut.result()
+                _share_preview_cells(nxt, cells)
+                page_rows = _preview_payload_to_rows(nxt)
+                if columns is not None:
+                    _extend_preview_columns(columns, nxt, page_rows, len(all_rows))
+                all_rows.extend(page_rows)
+                if on_page is not None:
+                    on_page(all_rows, page, last_page)
+    finally:
+        # Do not wait on a discarded probe; queued pages are cancelled if a page failed.
+        pool.shutdown(wait=False, cancel_futures=True)
 
     meta = {
         "record_count": first.get("record_count"),
@@ -1176,24 +2076,52 @@ def _fetch_preview_all_rows(
         "errors": first.get("errors", []),
         "paginator": first.get("paginator"),
     }
-    return all_rows, meta
+    field_names = [k for k in _preview_payload_keys(first) if isinstance(k, str)]
+    return all_rows, meta, field_names
+
+
+# The cohort definition lives server-side and is shared by every request using this cookie,
+# so clear/add/preview sequences must not interleave.
+_COHORT_LOCK = threading.Lock()
+# Runs remote cohort queries started ahead of the model reply (see /query).
+_REMOTE_QUERY_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="heartsmart-remote")
 
 
 def run_remote_collection_query(
     requested_collections: List[str],
+    cancelled: Optional[threading.Event] = None,
 ) -> Tuple[List[JsonObj], Dict[str, Any], List[str], List[str]]:
     """
     Applies real site collection filters via /cohort_def and returns preview rows.
     Returns: (rows, meta, applied_collections, unavailable_collections)
+    When `cancelled` is set before the cohort lock is acquired, nothing is sent and the
+    result is empty; callers that cancel ignore the result.
     """
     requested = [c for c in requested_collections if c in SITE_COLLECTION_IDS]
     if not requested:
         return [], {}, [], []
 
-    session = _heartsmart_session()
+    with _COHORT_LOCK:
+        if cancelled is not None and cancelled.is_set():
+            return [], {}, [], []
+        return _run_remote_collection_query_locked(requested, cancelled)
+
+
+def _run_remote_collection_query_locked(
+    requested: List[str],
+    cancelled: Optional[threading.Event] = None,
+) -> Tuple[List[JsonObj], Dict[str, Any], List[str], List[str]]:
+    # `cancelled` is checked between steps; a cancelled query stops there and the
+    # finally clause below clears whatever criteria it had added.
+    def is_cancelled() -> bool:
+        return cancelled is not None and cancelled.is_set()
+
+    # One config for the whole clear/add/preview sequence, even if settings change meanwhile.
+    cfg = _runtime
+    session = _heartsmart_session(cfg)
 
     # Reset cohort criteria each query so filters do not accumulate unexpectedly.
-    clear_resp = _api_post(session, "/cohort_def/", {"transformation": {"type": "clear_all"}})
+    clear_resp = _api_post(session, "/cohort_def/", {"transformation": {"type": "clear_all"}}, cfg=cfg)
     clear_errors = clear_resp.get("errors") if isinstance(clear_resp, dict) else None
     if clear_errors:
         raise RuntimeError(f"Failed to clear cohort filters: {clear_errors}")
@@ -1202,11 +2130,14 @@ def run_remote_collection_query(
     unavailable: List[str] = []
     try:
         for cid in requested:
+            if is_cancelled():
+                return [], {}, [], []
             try:
                 resp = _api_post(
                     session,
                     "/cohort_def/",
                     {"transformation": {"type": "add_criteria_set", "collection_id": cid}},
+                    cfg=cfg,
                 )
                 errs = resp.get("errors") if isinstance(resp, dict) else None
                 if errs:
@@ -1216,8 +2147,12 @@ def run_remote_collection_query(
             except Exception:
                 unavailable.append(cid)
 
-        rows, preview_meta = _fetch_preview_all_rows(session)
-        count_meta = _api_get(session, "/query_tools/count/")
+        if is_cancelled():
+            return [], {}, [], []
+        rows, preview_meta, _ = _fetch_preview_all_rows(session, scoped=True, cfg=cfg)
+        if is_cancelled():
+            return [], {}, [], []
+        count_meta = _api_get(session, "/query_tools/count/", cfg=cfg)
 
         meta = {
             "record_count": preview_meta.get("record_count"),
@@ -1230,78 +2165,72 @@ def run_remote_collection_query(
     finally:
         # Avoid leaking scoped cohort filters into subsequent "full dataset" preview calls.
         try:
-            _api_post(session, "/cohort_def/", {"transformation": {"type": "clear_all"}})
+            _api_post(session, "/cohort_def/", {"transformation": {"type": "clear_all"}}, cfg=cfg)
         except Exception:
             pass
 
 
 def _fields_in_spec(spec: Dict[str, Any]) -> List[str]:
-    out: List[str] = []
-
-    def walk(node: Any) -> None:
-        if not isinstance(node, dict):
-            return
-        if "and" in node and isinstance(node["and"], list):
-            for child in node["and"]:
-                walk(child)
-            return
-        if "or" in node and isinstance(node["or"], list):
-            for child in node["or"]:
-                walk(child)
-            return
-        if "not" in node:
-            walk(node["not"])
-            return
-        field = node.get("field")
-        if isinstance(field, str) and field not in out:
-            out.append(field)
-
-    walk(spec)
-    return out
+    return list(_scan_spec(spec)[0].fields)
 
 
 def _cell_text(value: Any) -> str:
+    if type(value) is str:
+        return value
     if value is None:
         return ""
     if isinstance(value, bool):
         return "true" if value else "false"
     if isinstance(value, (list, dict)):
-        return json.dumps(value, ensure_ascii=False)
+        return _json_text(value)
     return str(value)
 
 
+# Good default context columns if present in the dataset. Interned like the preview keys
+# (see _preview_payload_keys), so dict/set probes can match by identity.
+_DEFAULT_TABLE_COLUMNS: Tuple[str, ...] = tuple(
+    map(
+        sys.intern,
+        (
+            "Blinded ID",
+            "Cohort Source",
+            "Maternal Age",
+            "Paternal Age",
+            "Gender",
+            "Enrollment Site",
+        ),
+    )
+)
+
+
 def build_results_table(
     rows: List[JsonObj],
     preferred_columns: List[str],
     max_columns: Optional[int] = None,
 ) -> Tuple[List[str], List[List[str]], bool]:
     key_order: List[str] = []
+    key_seen: Set[str] = set()
     for row in rows:
         if not isinstance(row, dict):
             continue
         for k in row.keys():
-            if k not in key_order:
+            if k not in key_seen:
+                key_seen.add(k)
                 key_order.append(k)
 
     front: List[str] = []
+    front_set: Set[str] = set()
     for c in preferred_columns:
-        if c in key_order and c not in front:
+        if c in key_seen and c not in front_set:
+            front_set.add(c)
             front.append(c)
 
-    # Good default context columns if present in the dataset.
-    defaults = [
-        "Blinded ID",
-        "Cohort Source",
-        "Maternal Age",
-        "Paternal Age",
-        "Gender",
-        "Enrollment Site",
-    ]
-    for c in defaults:
-        if c in key_order and c not in front:
+    for c in _DEFAULT_TABLE_COLUMNS:
+        if c in key_seen and c not in front_set:
+            front_set.add(c)
             front.append(c)
 
-    remaining = [k for k in key_order if k not in front]
+    remaining = [k for k in key_order if k not in front_set]
     all_columns = front + remaining
     if max_columns is None:
         selected = all_columns
@@ -1309,9 +2238,7 @@ def build_results_table(
         selected = all_columns[:max_columns]
     truncated = len(all_columns) > len(selected)
 
-    table_rows: List[List[str]] = []
-    for row in rows:
-        table_rows.append([_cell_text(row.get(c)) for c in selected])
+    table_rows: List[List[str]] = [list(map(_cell_text, map(row.get, selected))) for row in rows]
 
     return selected, table_rows, truncated
 
@@ -1362,25 +2289,32 @@ def spec_to_human_text(spec: Any) -> str:
     if isinstance(value, str):
         rhs = f'"{value}"'
     elif isinstance(value, (list, dict)):
-        rhs = json.dumps(value, ensure_ascii=False)
+        rhs = _json_text(value)
     else:
         rhs = str(value)
     return f"{field} {op_label} {rhs}"
 
 
+# Candidate ID columns, most preferred first. Interned to match the preview keys.
+_ID_FIELD_ORDER: Tuple[str, ...] = tuple(
+    map(
+        sys.intern,
+        (
+            "Blinded ID",
+            "Subject ID",
+            "subject_id",
+            "Subject",
+            "ID",
+            "id",
+            "Sample ID (All)",
+        ),
+    )
+)
+
+
 def _preferred_id_field_from_keys(keys: Set[str]) -> Optional[str]:
-    for k in [
-        "Blinded ID",
-        "Subject ID",
-        "subject_id",
-        "Subject",
-        "ID",
-        "id",
-        "Sample ID (All)",
-    ]:
-        if k in keys:
-            return k
-    return None
+    # Probe the few candidates against the key set rather than ranking every key.
+    return next((k for k in _ID_FIELD_ORDER if k in keys), None)
 
 
 def _preferred_id_field(rows: List[JsonObj]) -> Optional[str]:
@@ -1409,6 +2343,13 @@ def _dedupe_preserve_order(values: List[str]) -> List[str]:
     return out
 
 
+_SUBJECT_ID_RE = re.compile(r"\b(\d{1,4})-(\d{3,})\b")
+_SUBJECT_ID_RANGE_RE = re.compile(
+    r"\b(\d{1,4})-(\d{3,})\s*(?:to|through|thru|-)\s*(\d{1,4})-(\d{3,})\b",
+    flags=re.IGNORECASE,
+)
+
+
 def extract_subject_id_tokens(nl_query: str, max_range_size: int = 2000) -> List[str]:
     """
     Extracts one or more subject IDs from query text, including ranges like:
@@ -1418,11 +2359,7 @@ def extract_subject_id_tokens(nl_query: str, max_range_size: int = 2000) -> List
     out: List[str] = []
     seen: Set[str] = set()
 
-    range_pattern = re.compile(
-        r"\b(\d{1,4})-(\d{3,})\s*(?:to|through|thru|-)\s*(\d{1,4})-(\d{3,})\b",
-        flags=re.IGNORECASE,
-    )
-    for m in range_pattern.finditer(text):
+    for m in _SUBJECT_ID_RANGE_RE.finditer(text):
         left_prefix, left_num, right_prefix, right_num = m.group(1), m.group(2), m.group(3), m.group(4)
         if left_prefix == right_prefix:
             start = int(left_num)
@@ -1441,7 +2378,7 @@ def extract_subject_id_tokens(nl_query: str, max_range_size: int = 2000) -> List
                 seen.add(token)
                 out.append(token)
 
-    for prefix, num in re.findall(r"\b(\d{1,4})-(\d{3,})\b", text):
+    for prefix, num in _SUBJECT_ID_RE.findall(text):
         token = f"{prefix}-{num}"
         if token not in seen:
             seen.add(token)
@@ -1510,10 +2447,16 @@ def add_subject_id_constraint(spec: Dict[str, Any], id_field: str, subject_id: s
     return add_subject_id_constraints(spec, id_field, [subject_id])
 
 
+_NON_ALPHA_RE = re.compile(r"[^a-z]+")
+_SEX_WORD_RE = re.compile(r"\bsex\b")
+_MALE_WORD_RE = re.compile(r"\b(male|males|man|men)\b")
+_FEMALE_WORD_RE = re.compile(r"\b(female|females|woman|women)\b")
+
+
 def _canonical_gender_word(value: Any) -> Optional[str]:
     if not isinstance(value, str):
         return None
-    token = re.sub(r"[^a-z]+", "", value.lower())
+    token = _NON_ALPHA_RE.sub("", value.lower())
     if token in {"m", "male", "males", "man", "men"}:
         return "male"
     if token in {"f", "female", "females", "woman", "women"}:
@@ -1533,7 +2476,7 @@ def _is_gender_field(field_name: Any) -> bool:
     if not isinstance(field_name, str):
         return False
     norm = _normalize_for_match(field_name)
-    return ("gender" in norm) or (re.search(r"\bsex\b", norm) is not None)
+    return ("gender" in norm) or (_SEX_WORD_RE.search(norm) is not None)
 
 
 def _rewrite_gender_conditions(spec: Dict[str, Any]) -> Dict[str, Any]:
@@ -1579,29 +2522,31 @@ def _rewrite_gender_conditions(spec: Dict[str, Any]) -> Dict[str, Any]:
     return rewritten if isinstance(rewritten, dict) else spec
 
 
+_AGE_HINT_PATTERNS: List[Tuple[re.Pattern[str], str]] = [
+    (re.compile(r"\b(?:older than|greater than|more than|over)\s+(\d+(?:\.\d+)?)\b"), "gt"),
+    (re.compile(r"\b(?:older than|greater than|more than|over)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b"), "gt"),
+    (re.compile(r"\b(?:at least|minimum(?: of)?|no less than)\s+(\d+(?:\.\d+)?)\b"), "gte"),
+    (re.compile(r"\b(?:at least|minimum(?: of)?|no less than)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b"), "gte"),
+    (re.compile(r"\b(?:younger than|less than|under|below)\s+(?:the\s+age\s+of\s+)?(\d+(?:\.\d+)?)\b"), "lt"),
+    (re.compile(r"\b(?:younger than|less than|under|below)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b"), "lt"),
+    (re.compile(r"\b(?:at most|maximum(?: of)?|no more than)\s+(\d+(?:\.\d+)?)\b"), "lte"),
+    (re.compile(r"\b(?:at most|maximum(?: of)?|no more than)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b"), "lte"),
+    (re.compile(r"\bage\s+(?:older than|greater than|more than|over)\s+(\d+(?:\.\d+)?)\b"), "gt"),
+    (re.compile(r"\bage\s+(?:younger than|less than|under|below)\s+(\d+(?:\.\d+)?)\b"), "lt"),
+    (re.compile(r"\bage\s*(?:>=|=>)\s*(\d+(?:\.\d+)?)\b"), "gte"),
+    (re.compile(r"\bage\s*(?:<=|=<)\s*(\d+(?:\.\d+)?)\b"), "lte"),
+    (re.compile(r"\bage\s*>\s*(\d+(?:\.\d+)?)\b"), "gt"),
+    (re.compile(r"\bage\s*<\s*(\d+(?:\.\d+)?)\b"), "lt"),
+]
+
+
 def _extract_age_hint_from_query(nl_query: str) -> Optional[Tuple[str, float]]:
     q = (nl_query or "").lower()
     if "age" not in q:
         return None
 
-    patterns: List[Tuple[str, str]] = [
-        (r"\b(?:older than|greater than|more than|over)\s+(\d+(?:\.\d+)?)\b", "gt"),
-        (r"\b(?:older than|greater than|more than|over)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b", "gt"),
-        (r"\b(?:at least|minimum(?: of)?|no less than)\s+(\d+(?:\.\d+)?)\b", "gte"),
-        (r"\b(?:at least|minimum(?: of)?|no less than)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b", "gte"),
-        (r"\b(?:younger than|less than|under|below)\s+(?:the\s+age\s+of\s+)?(\d+(?:\.\d+)?)\b", "lt"),
-        (r"\b(?:younger than|less than|under|below)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b", "lt"),
-        (r"\b(?:at most|maximum(?: of)?|no more than)\s+(\d+(?:\.\d+)?)\b", "lte"),
-        (r"\b(?:at most|maximum(?: of)?|no more than)\s+(?:the\s+)?(?:age\s*(?:of)?\s+)?(\d+(?:\.\d+)?)\b", "lte"),
-        (r"\bage\s+(?:older than|greater than|more than|over)\s+(\d+(?:\.\d+)?)\b", "gt"),
-        (r"\bage\s+(?:younger than|less than|under|below)\s+(\d+(?:\.\d+)?)\b", "lt"),
-        (r"\bage\s*(?:>=|=>)\s*(\d+(?:\.\d+)?)\b", "gte"),
-        (r"\bage\s*(?:<=|=<)\s*(\d+(?:\.\d+)?)\b", "lte"),
-        (r"\bage\s*>\s*(\d+(?:\.\d+)?)\b", "gt"),
-        (r"\bage\s*<\s*(\d+(?:\.\d+)?)\b", "lt"),
-    ]
-    for pattern, op in patterns:
-        m = re.search(pattern, q)
+    for pattern, op in _AGE_HINT_PATTERNS:
+        m = pattern.search(q)
         if not m:
             continue
         try:
@@ -1649,8 +2594,8 @@ def _spec_has_age_condition(spec: Dict[str, Any]) -> bool:
 
 def _extract_gender_hint_from_query(nl_query: str) -> Optional[str]:
     q = (nl_query or "").lower()
-    has_male = re.search(r"\b(male|males|man|men)\b", q) is not None
-    has_female = re.search(r"\b(female|females|woman|women)\b", q) is not None
+    has_male = _MALE_WORD_RE.search(q) is not None
+    has_female = _FEMALE_WORD_RE.search(q) is not None
     if has_male and not has_female:
         return "male"
     if has_female and not has_male:
@@ -1733,40 +2678,69 @@ def _postprocess_spec_for_query(
     return out
 
 
-def _count_unique_people(rows: List[JsonObj]) -> Optional[int]:
-    id_field = _preferred_id_field(rows)
-    if not id_field:
-        return None
+def _summary_scan(
+    rows: List[JsonObj],
+    id_field: str,
+    subject_ids: List[str],
+) -> Tuple[int, List[str], Optional[JsonObj], int]:
+    """
+    Single pass over matched rows for the assistant summary. Returns
+    (unique people, requested IDs found in row order, first row of the one requested
+    subject, number of rows for that subject).
+    """
+    wanted = set(subject_ids)
+    single_id = subject_ids[0] if len(subject_ids) == 1 else None
     ids: Set[str] = set()
+    found: List[str] = []
+    subject_row: Optional[JsonObj] = None
+    subject_row_count = 0
     for r in rows:
         if not isinstance(r, dict):
             continue
         pid = _cell_text(r.get(id_field)).strip()
-        if pid:
+        if not pid:
+            continue
+        if pid not in ids:
             ids.add(pid)
-    return len(ids)
+            if pid in wanted:
+                found.append(pid)
+        if pid == single_id:
+            if subject_row is None:
+                subject_row = r
+            subject_row_count += 1
+    return len(ids), found, subject_row, subject_row_count
+
+
+_COUNT_RE = re.compile(r"\b(how many|count|number of|total)\b")
 
 
 def _is_count_query(nl_query: str) -> bool:
     q = (nl_query or "").lower()
-    return bool(re.search(r"\b(how many|count|number of|total)\b", q))
+    return _COUNT_RE.search(q) is not None
+
+
+_SUMMARY_PREFERRED_FIELDS: Tuple[str, ...] = tuple(
+    map(
+        sys.intern,
+        (
+            "Cohort Source",
+            "Gender",
+            "Maternal Age",
+            "Paternal Age",
+            "Enrollment Site",
+            "Working Group",
+            "Consent Group",
+            "Relationship",
+        ),
+    )
+)
 
 
 def _meaningful_row_pairs(row: JsonObj, max_items: int = 8) -> List[str]:
-    preferred = [
-        "Cohort Source",
-        "Gender",
-        "Maternal Age",
-        "Paternal Age",
-        "Enrollment Site",
-        "Working Group",
-        "Consent Group",
-        "Relationship",
-    ]
     out: List[str] = []
     used: Set[str] = set()
 
-    for key in preferred:
+    for key in _SUMMARY_PREFERRED_FIELDS:
         v = row.get(key)
         if _is_meaningful_value(v):
             out.append(f"{key}: {_cell_text(v)}")
@@ -1796,7 +2770,7 @@ def build_query_to_run_text(
         f"Natural language: {nl_query}\n"
         f"Collections: {collection_part}\n"
         f"Field filters: {human_filter}\n"
-        f"Spec JSON: {json.dumps(spec, ensure_ascii=False)}"
+        f"Spec JSON: {_json_text(spec)}"
     )
 
 
@@ -1823,39 +2797,20 @@ def build_assistant_summary(
             msg += f" Some requested collections were not applied: {unavailable_text}."
         return msg
 
-    unique_people = _count_unique_people(rows)
-    people_count = unique_people if unique_people is not None else matched_count
-
     subject_ids = extract_subject_id_tokens(nl_query)
     id_field = _preferred_id_field(rows)
-    if subject_ids and id_field:
-        wanted = set(subject_ids)
-        matched_ids_ordered: List[str] = []
-        seen_ids: Set[str] = set()
-        for r in rows:
-            if not isinstance(r, dict):
-                continue
-            sid = _cell_text(r.get(id_field)).strip()
-            if sid and sid in wanted and sid not in seen_ids:
-                seen_ids.add(sid)
-                matched_ids_ordered.append(sid)
+    unique_people: Optional[int] = None
+    matched_ids_ordered: List[str] = []
+    row: Optional[JsonObj] = None
+    row_count_for_subject = 0
+    if id_field:
+        unique_people, matched_ids_ordered, row, row_count_for_subject = _summary_scan(rows, id_field, subject_ids)
+    people_count = unique_people if unique_people is not None else matched_count
 
+    if subject_ids and id_field:
         if len(subject_ids) == 1:
             subject_id = subject_ids[0]
-            row = next(
-                (
-                    r
-                    for r in rows
-                    if isinstance(r, dict) and _cell_text(r.get(id_field)).strip() == subject_id
-                ),
-                None,
-            )
             if row:
-                row_count_for_subject = sum(
-                    1
-                    for r in rows
-                    if isinstance(r, dict) and _cell_text(r.get(id_field)).strip() == subject_id
-                )
                 detail_pairs = _meaningful_row_pairs(row, max_items=8)
                 details = ", ".join(detail_pairs) if detail_pairs else "No additional populated fields were found."
                 msg = f"I found subject {subject_id} in {collection_text}."
@@ -1906,6 +2861,28 @@ def _fields_preview_text(fields: List[str]) -> str:
     return "\n".join(fields[:200]) + ("" if len(fields) <= 200 else f"\n... (+{len(fields)-200} more)")
 
 
+def _prompt_field_list_text(fields: List[str]) -> str:
+    field_list = ", ".join(fields[:300])
+    if len(fields) > 300:
+        field_list += f", ... (+{len(fields)-300} more)"
+    return field_list
+
+
+def _build_field_views(fields: List[str]) -> _FieldViews:
+    return _FieldViews(fields, frozenset(fields), _fields_preview_text(fields), _prompt_field_list_text(fields))
+
+
+def _field_views(fields: List[str]) -> _FieldViews:
+    """
+    Allowed-field set and preview/prompt texts for `fields`, reused while it is the
+    published field list; partial-load field lists are derived per call.
+    """
+    views = _FIELD_VIEWS
+    if views is not None and views.fields is fields:
+        return views
+    return _build_field_views(fields)
+
+
 def _background_load_worker() -> None:
     global _BACKGROUND_LOAD_ERROR
     try:
@@ -1940,165 +2917,375 @@ def _ensure_background_data_load() -> None:
 def _load_state_snapshot() -> Tuple[bool, Optional[str], Optional[str], List[str], Optional[Tuple[float, int]]]:
     with _LOAD_LOCK:
         if _cache_is_ready():
-            return True, None, None, list(_FIELDS_CACHE or []), _LOAD_INFO
+            return True, None, None, _FIELDS_CACHE or [], _LOAD_INFO
         if _BACKGROUND_LOAD_THREAD is not None and _BACKGROUND_LOAD_THREAD.is_alive():
             elapsed = 0
             if _BACKGROUND_LOAD_STARTED_AT is not None:
                 elapsed = max(0, int(time.time() - _BACKGROUND_LOAD_STARTED_AT))
+            if _PAGES_TOTAL is not None:
+                return False, f"Loading in background... {_PAGES_LOADED}/{_PAGES_TOTAL} pages, {elapsed}s", None, [], None
             return False, f"Loading in background... {elapsed}s", None, [], None
         if _BACKGROUND_LOAD_ERROR:
             return False, None, _BACKGROUND_LOAD_ERROR, [], None
         return False, "Preparing background load...", None, [], None
 
 
+def _partial_data_snapshot() -> Optional[Tuple[JsonObj, List[str], str]]:
+    """
+    Rows received so far by a load still in flight, as (data, fields, note).
+    None when the cache is complete or no page has arrived yet.
+    """
+    with _LOAD_LOCK:
+        if _cache_is_ready() or not _PARTIAL_ROWS or not _PARTIAL_ROW_COUNT:
+            return None
+        rows = _PARTIAL_ROWS[:_PARTIAL_ROW_COUNT]
+        pages_loaded, pages_total = _PAGES_LOADED, _PAGES_TOTAL
+    data: JsonObj = {
+        "rows_as_objects": rows,
+        "source": _runtime_data_source_label(),
+        "meta": {},
+    }
+    fields: List[str] = []
+    for r in rows:
+        if isinstance(r, dict):
+            fields = sorted(r)
+            break
+    note = (
+        f"Data is still loading: searched the {len(rows)} rows from {pages_loaded}/{pages_total} pages "
+        "loaded so far, so results may be incomplete."
+    )
+    return data, fields, note
+
+
 def load_data_once() -> Tuple[JsonObj, List[str], Tuple[float, int]]:
-    global _DATA_CACHE, _FIELDS_CACHE, _LOAD_INFO, _BACKGROUND_LOAD_ERROR
+    global _DATA_CACHE, _FIELDS_CACHE, _FIELD_VIEWS, _LOAD_INFO, _BACKGROUND_LOAD_ERROR
     if _cache_is_ready():
         return _DATA_CACHE, _FIELDS_CACHE, _LOAD_INFO  # type: ignore[return-value]
 
-    with _LOAD_LOCK:
-        if _cache_is_ready():
-            return _DATA_CACHE, _FIELDS_CACHE, _LOAD_INFO  # type: ignore[return-value]
+    with _LOAD_FETCH_LOCK:
+        with _LOAD_LOCK:
+            if _cache_is_ready():
+                return _DATA_CACHE, _FIELDS_CACHE, _LOAD_INFO  # type: ignore[return-value]
+            generation = _LOAD_GENERATION
+            _reset_load_progress_unlocked()
+            # The config this generation loads from; every request of the load uses it.
+            cfg = _runtime
+            source = cfg.data_source_label
+            per_page = cfg.per_page
+
+        def on_page(rows_so_far: List[JsonObj], pages_loaded: int, last_page: int) -> None:
+            global _PAGES_LOADED, _PAGES_TOTAL, _PARTIAL_ROWS, _PARTIAL_ROW_COUNT
+            with _LOAD_LOCK:
+                if generation != _LOAD_GENERATION:
+                    return
+                _PAGES_LOADED = pages_loaded
+                _PAGES_TOTAL = last_page
+                _PARTIAL_ROWS = rows_so_far
+                _PARTIAL_ROW_COUNT = len(rows_so_far)
 
         t0 = time.time()
-        session = _heartsmart_session()
-        # Best effort only; preview reads can still work even when cohort_def is unauthorized.
+        columns: Dict[str, List[Any]] = {}
         try:
-            clear_resp = _api_post(session, "/cohort_def/", {"transformation": {"type": "clear_all"}})
-            clear_errors = clear_resp.get("errors") if isinstance(clear_resp, dict) else None
-            if clear_errors:
-                raise RuntimeError(f"Failed to clear cohort filters before preview load: {clear_errors}")
-        except Exception as exc:
-            if not _is_auth_error(exc):
-                raise
-        rows, meta = _fetch_preview_all_rows(session, per_page=_RUNTIME_PREVIEW_PAGE_SIZE)
+            session = _heartsmart_session(cfg)
+            # Remote collection queries (which /query runs while this load is in progress)
+            # edit the same server-side cohort; hold them off until every unscoped page is in.
+            with _COHORT_LOCK:
+                # Best effort only; preview reads can still work even when cohort_def is unauthorized.
+                cohort_cleared = False
+                try:
+                    clear_resp = _api_post(
+                        session, "/cohort_def/", {"transformation": {"type": "clear_all"}}, cfg=cfg
+                    )
+                    clear_errors = clear_resp.get("errors") if isinstance(clear_resp, dict) else None
+                    if clear_errors:
+                        raise RuntimeError(f"Failed to clear cohort filters before preview load: {clear_errors}")
+                    cohort_cleared = True
+                except Exception as exc:
+                    if not _is_auth_error(exc):
+                        raise
+                rows, meta, field_names = _fetch_preview_all_rows(
+                    session,
+                    per_page=per_page,
+                    columns=columns,
+                    disk_cache=cohort_cleared,
+                    on_page=on_page,
+                    cfg=cfg,
+                )
+        except Exception:
+            # Do not keep serving partial rows of a load that failed.
+            with _LOAD_LOCK:
+                if generation == _LOAD_GENERATION:
+                    _reset_load_progress_unlocked()
+            raise
         data: JsonObj = {
             "rows_as_objects": rows,
-            "source": _runtime_data_source_label(),
+            "columns": columns,
+            "source": source,
             "meta": meta,
         }
-        fields: List[str] = []
-        for r in rows:
-            if isinstance(r, dict):
-                fields = sorted(list(r.keys()))
-                break
+        # The declared columns, so fields missing from the first row still reach the prompt.
+        # Names are already interned by _preview_payload_keys.
+        fields = sorted(set(field_names))
         t1 = time.time()
         info = (t1 - t0, len(rows))
+        views = _build_field_views(fields)
 
-        _DATA_CACHE = data
-        _FIELDS_CACHE = fields
-        _LOAD_INFO = info
-        _BACKGROUND_LOAD_ERROR = None
+        with _LOAD_LOCK:
+            # Settings changed mid-load: hand the rows to this caller but leave the cache empty.
+            if generation == _LOAD_GENERATION:
+                _DATA_CACHE = data
+                _FIELDS_CACHE = fields
+                _FIELD_VIEWS = views
+                _LOAD_INFO = info
+                _BACKGROUND_LOAD_ERROR = None
+                _reset_load_progress_unlocked()
         return data, fields, info
 
 
+class SpecInfo(NamedTuple):
+    """
+    What one pass over a spec learns: its nesting depth and the leaf fields in
+    first-use order, both along the branches parser.matches() evaluates.
+    """
+
+    depth: int
+    fields: Tuple[str, ...]
+
+
+_SPEC_LOGICAL_KEYS: FrozenSet[str] = frozenset({"and", "or", "not"})
+_SPEC_MAX_DEPTH = 12
+_SPEC_MAX_CHILDREN = 50
+
+
+def _spec_leaf_error(node: Dict[str, Any], allowed_fields: Optional[AbstractSet[str]]) -> Optional[str]:
+    if "field" not in node:
+        return "Leaf condition missing 'field'"
+    if "op" not in node:
+        return "Leaf condition missing 'op'"
+    field = node["field"]
+    op = node["op"]
+    if not isinstance(field, str) or (allowed_fields is not None and field not in allowed_fields):
+        return f"Unknown field: {field!r}"
+    if not isinstance(op, str) or op not in ALLOWED_OPS:
+        return f"Unsupported op: {op!r}"
+    keys = set(node.keys())
+    if op in {"exists", "isnull"}:
+        extra = keys - {"field", "op"}
+        return f"Unexpected keys for op {op}: {sorted(extra)}" if extra else None
+    # value-required ops
+    if "value" not in node:
+        return f"Leaf condition op {op!r} requires 'value'"
+    extra = keys - {"field", "op", "value"}
+    return f"Unexpected keys in leaf node: {sorted(extra)}" if extra else None
+
+
+def _scan_spec(
+    spec: Any,
+    allowed_fields: Optional[AbstractSet[str]] = None,
+    max_depth: Optional[int] = None,
+) -> Tuple[SpecInfo, Optional[str]]:
+    """
+    Single iterative pass over a spec. Returns its SpecInfo plus the first validation
+    error in depth-first order (None when valid). Going past `max_depth` stops the scan
+    right away with the depth error. `allowed_fields=None` skips the field-name check.
+    """
+    max_seen = 0
+    fields: List[str] = []
+    seen: Set[str] = set()
+    error: Optional[str] = None
+    # Tasks are (kind, node, depth, on_path). `on_path` marks the branch parser.matches()
+    # follows (and > or > not); only those count towards depth/fields, the rest only validate.
+    stack: List[Tuple[str, Any, int, bool]] = [("node", spec, 0, True)]
+    while stack:
+        kind, node, depth, on_path = stack.pop()
+        if error is not None and not on_path:
+            continue
+
+        if kind == "extra":
+            # allow only logical keys at this node (checked after its children, like the recursion did)
+            extra = node.keys() - _SPEC_LOGICAL_KEYS
+            if extra:
+                error = f"Unexpected keys in logical node: {sorted(extra)}"
+            continue
+        if kind == "list":
+            parent, key = node
+            children = parent[key]
+            if error is None and (not isinstance(children, list) or len(children) > _SPEC_MAX_CHILDREN):
+                error = f"'{key}' must be a list (max {_SPEC_MAX_CHILDREN})"
+            if isinstance(children, list):
+                stack.extend(("node", child, depth, on_path) for child in reversed(children))
+            continue
+
+        is_dict = isinstance(node, dict)
+        path_key: Optional[str] = None
+        if on_path:
+            # Depth first, for every node type: it outranks any other error.
+            if not is_dict:
+                max_seen = max(max_seen, depth)
+            else:
+                if isinstance(node.get("and"), list):
+                    path_key = "and"
+                elif isinstance(node.get("or"), list):
+                    path_key = "or"
+                elif "not" in node:
+                    path_key = "not"
+                if path_key is None:
+                    max_seen = max(max_seen, depth + 1)
+                    field = node.get("field")
+                    if isinstance(field, str) and field not in seen:
+                        seen.add(field)
+                        fields.append(field)
+                elif path_key != "not":
+                    max_seen = max(max_seen, depth)
+            if max_depth is not None and max_seen > max_depth:
+                return SpecInfo(max_seen, tuple(fields)), "Spec too deep/complex"
+
+        if not is_dict:
+            if error is None:
+                error = "Invalid node (must be object)"
+            continue
+
+        if node.keys() & _SPEC_LOGICAL_KEYS:
+            tasks: List[Tuple[str, Any, int, bool]] = []
+            for key in ("and", "or"):
+                if key in node:
+                    tasks.append(("list", (node, key), depth + 1, path_key == key))
+            if "not" in node:
+                tasks.append(("node", node["not"], depth + 1, path_key == "not"))
+            tasks.append(("extra", node, depth, False))
+            stack.extend(reversed(tasks))
+        elif error is None:
+            error = _spec_leaf_error(node, allowed_fields)
+
+    return SpecInfo(max_seen, tuple(fields)), error
+
+
 def _spec_depth(spec: Any, depth: int = 0) -> int:
+    return depth + _scan_spec(spec)[0].depth
+
+
+def analyze_spec(spec: Any, allowed_fields: AbstractSet[str]) -> SpecInfo:
+    """
+    Validates a spec (see validate_spec) and returns its SpecInfo from the same pass.
+    """
     if not isinstance(spec, dict):
-        return depth
-    if "and" in spec and isinstance(spec["and"], list):
-        return max([depth] + [_spec_depth(s, depth + 1) for s in spec["and"]])
-    if "or" in spec and isinstance(spec["or"], list):
-        return max([depth] + [_spec_depth(s, depth + 1) for s in spec["or"]])
-    if "not" in spec:
-        return _spec_depth(spec["not"], depth + 1)
-    return depth + 1
+        raise ValueError("Spec must be a JSON object")
+    info, error = _scan_spec(spec, allowed_fields, max_depth=_SPEC_MAX_DEPTH)
+    if error is not None:
+        raise ValueError(error)
+    return info
 
 
-def validate_spec(spec: Any, allowed_fields: Set[str]) -> None:
+def validate_spec(spec: Any, allowed_fields: AbstractSet[str]) -> None:
     """
     Defensive validation. We do NOT execute arbitrary code; we only accept
     a small JSON structure compatible with parser.matches().
     """
-    if not isinstance(spec, dict):
-        raise ValueError("Spec must be a JSON object")
-    if _spec_depth(spec) > 12:
-        raise ValueError("Spec too deep/complex")
+    analyze_spec(spec, allowed_fields)
+
+
+_SPEC_SCALAR_SCHEMAS: List[Dict[str, Any]] = [{"type": "string"}, {"type": "number"}, {"type": "boolean"}]
+
+# Structured-output schema for the model reply. Strict mode needs every property listed as
+# required, so optional parts are nullable ("notes", and "value" for exists/isnull).
+SPEC_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "spec": {"$ref": "#/$defs/node"},
+        "notes": {"type": ["string", "null"]},
+        "collections": {"type": "array", "items": {"type": "string", "enum": list(_SITE_IDS)}},
+    },
+    "required": ["spec", "notes", "collections"],
+    "additionalProperties": False,
+    "$defs": {
+        "node": {
+            "anyOf": [
+                {"$ref": "#/$defs/and"},
+                {"$ref": "#/$defs/or"},
+                {"$ref": "#/$defs/not"},
+                {"$ref": "#/$defs/leaf"},
+            ]
+        },
+        "and": {
+            "type": "object",
+            "properties": {"and": {"type": "array", "items": {"$ref": "#/$defs/node"}}},
+            "required": ["and"],
+            "additionalProperties": False,
+        },
+        "or": {
+            "type": "object",
+            "properties": {"or": {"type": "array", "items": {"$ref": "#/$defs/node"}}},
+            "required": ["or"],
+            "additionalProperties": False,
+        },
+        "not": {
+            "type": "object",
+            "properties": {"not": {"$ref": "#/$defs/node"}},
+            "required": ["not"],
+            "additionalProperties": False,
+        },
+        "leaf": {
+            "type": "object",
+            "properties": {
+                "field": {"type": "string"},
+                "op": {"type": "string", "enum": sorted(ALLOWED_OPS)},
+                "value": {
+                    "anyOf": _SPEC_SCALAR_SCHEMAS
+                    + [{"type": "null"}, {"type": "array", "items": {"anyOf": _SPEC_SCALAR_SCHEMAS}}]
+                },
+            },
+            "required": ["field", "op", "value"],
+            "additionalProperties": False,
+        },
+    },
+}
 
-    def walk(node: Any) -> None:
-        if not isinstance(node, dict):
-            raise ValueError("Invalid node (must be object)")
-
-        keys = set(node.keys())
-        if keys & {"and", "or", "not"}:
-            if "and" in node:
-                if not isinstance(node["and"], list) or len(node["and"]) > 50:
-                    raise ValueError("'and' must be a list (max 50)")
-                for child in node["and"]:
-                    walk(child)
-            if "or" in node:
-                if not isinstance(node["or"], list) or len(node["or"]) > 50:
-                    raise ValueError("'or' must be a list (max 50)")
-                for child in node["or"]:
-                    walk(child)
-            if "not" in node:
-                walk(node["not"])
-            # allow only logical keys at this node
-            extra = keys - {"and", "or", "not"}
-            if extra:
-                raise ValueError(f"Unexpected keys in logical node: {sorted(extra)}")
-            return
 
-        # leaf condition
-        if "field" not in node:
-            raise ValueError("Leaf condition missing 'field'")
-        if "op" not in node:
-            raise ValueError("Leaf condition missing 'op'")
-        field = node["field"]
-        op = node["op"]
-        if not isinstance(field, str) or field not in allowed_fields:
-            raise ValueError(f"Unknown field: {field!r}")
-        if not isinstance(op, str) or op not in ALLOWED_OPS:
-            raise ValueError(f"Unsupported op: {op!r}")
-        if op in {"exists", "isnull"}:
-            extra = keys - {"field", "op"}
-            if extra:
-                raise ValueError(f"Unexpected keys for op {op}: {sorted(extra)}")
-            return
-        # value-required ops
-        if "value" not in node:
-            raise ValueError(f"Leaf condition op {op!r} requires 'value'")
-        extra = keys - {"field", "op", "value"}
-        if extra:
-            raise ValueError(f"Unexpected keys in leaf node: {sorted(extra)}")
+def _drop_null_existence_values(spec: Any) -> Any:
+    """
+    Removes the null "value" strict mode forces onto exists/isnull leaves, since
+    validate_spec only accepts {"field", "op"} for those ops.
+    """
+    if not isinstance(spec, dict):
+        return spec
+    if "and" in spec or "or" in spec or "not" in spec:
+        out: Dict[str, Any] = {}
+        for k, v in spec.items():
+            if k in ("and", "or") and isinstance(v, list):
+                out[k] = [_drop_null_existence_values(child) for child in v]
+            elif k == "not":
+                out[k] = _drop_null_existence_values(v)
+            else:
+                out[k] = v
+        return out
+    if spec.get("op") in {"exists", "isnull"} and "value" in spec and spec["value"] is None:
+        return {k: v for k, v in spec.items() if k != "value"}
+    return spec
 
-    walk(spec)
+
+_PROMPT_COLLECTIONS_LIST = "\n".join(f"- {cid} ({cname})" for cid, cname in zip(_SITE_IDS, _SITE_NAMES))
 
 
 def build_llm_prompt(nl_query: str, fields: List[str]) -> str:
-    # Include parser logic (as requested), plus the available fields and schema.
+    # The response schema enforces the spec structure, so only semantics are described here.
     # Keep it tight so we don't waste tokens on the huge dataset.
     parser_code = (
-        "Parser logic summary (verbatim structure):\n"
-        "- Spec supports:\n"
-        '  {"and": [<spec|cond>, ...]}\n'
-        '  {"or":  [<spec|cond>, ...]}\n'
-        '  {"not": <spec|cond>}\n'
-        '- Leaf condition is:\n'
-        '  {"field": "<field name>", "op": "<op>", "value": <any>}\n'
-        '  For ops "exists" and "isnull", omit "value".\n'
-        "- Allowed ops: exists, isnull, eq, ne, in, nin, contains, startswith, endswith, regex, gt, gte, lt, lte\n"
+        "Parser notes:\n"
+        '- Combine conditions with {"and": [...]}, {"or": [...]} and {"not": <condition>}.\n'
+        '- For ops "exists" and "isnull", set "value" to null.\n'
         "- Numeric compares (gt/gte/lt/lte) coerce strings to numbers when possible.\n"
     )
 
-    field_list = ", ".join(fields[:300])
-    if len(fields) > 300:
-        field_list += f", ... (+{len(fields)-300} more)"
-
-    collections_list = "\n".join(
-        f"- {c['permanent_id']} ({c['name']})"
-        for c in SITE_COLLECTIONS
-    )
+    field_list = _field_views(fields).prompt_list
+    collections_list = _PROMPT_COLLECTIONS_LIST
 
     return f"""
 You convert an English query into a STRICT JSON filter spec for the parser described below.
 
 RULES:
-- Output MUST be valid JSON only (no markdown, no commentary).
-- Output MUST be an object with keys: "spec" and optional "notes" and optional "collections".
-- "spec" MUST follow the parser schema exactly.
 - Use ONLY the provided field names exactly as written (case/spacing).
 - Prefer "and" to combine multiple constraints.
-- If the user asks for "age" without clarifying, pick the most explicit matching field name; add a brief note in "notes".
+- If the user asks for "age" without clarifying, pick the most explicit matching field name; add a brief note in "notes" (otherwise null).
 - Treat "male/female/males/females" as gender values and map them to the best gender field (e.g., "Gender").
 - For age comparisons, assume age values can be strings like "20 years, 196 days"; still output numeric thresholds (e.g., 20, 30).
 - If the user asks for site-level collection filters (example: Labs, RxNorm, emrdata_hpo), do not turn those into field conditions.
@@ -2131,30 +3318,100 @@ User query:
 """.strip()
 
 
+_OPENAI_CLIENT_LOCK = threading.Lock()
+_OPENAI_CLIENT: Optional[Any] = None
+
+
+def _openai_client() -> Any:
+    """
+    Shared OpenAI client, created on first use. The client is thread-safe and keeps its
+    HTTP connection pool, so /query calls after the first skip the TCP/TLS handshake.
+    """
+    global _OPENAI_CLIENT
+    with _OPENAI_CLIENT_LOCK:
+        if _OPENAI_CLIENT is None:
+            _OPENAI_CLIENT = OpenAI()
+        return _OPENAI_CLIENT
+
+
+_SPEC_CACHE_TTL_SEC = 24 * 60 * 60.0
+_SPEC_CACHE_MAX_ENTRIES = 2048
+_SPEC_CACHE_LOCK = threading.Lock()
+# key -> (expires_at, (spec, notes, collections)) as returned by the model, least recently used first.
+_SPEC_CACHE: "OrderedDict[bytes, Tuple[float, Tuple[Dict[str, Any], Optional[str], List[str]]]]" = OrderedDict()
+
+
+def _spec_cache_key(nl_query: str, fields: List[str]) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(OPENAI_MODEL.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(nl_query.strip().lower().encode("utf-8"))
+    for field in fields:
+        h.update(b"\x00")
+        h.update(field.encode("utf-8"))
+    return h.digest()
+
+
 def call_openai_for_spec(nl_query: str, fields: List[str]) -> Tuple[Dict[str, Any], Optional[str], List[str]]:
+    """
+    Cached front for the model call: the spec depends only on the question, the model and
+    the available fields. Callers get their own copy of the spec and may mutate it.
+    """
+    key = _spec_cache_key(nl_query, fields)
+    now = time.monotonic()
+    with _SPEC_CACHE_LOCK:
+        entry = _SPEC_CACHE.get(key)
+        if entry is not None and entry[0] <= now:
+            del _SPEC_CACHE[key]
+            entry = None
+        if entry is not None:
+            _SPEC_CACHE.move_to_end(key)
+    if entry is None:
+        result = _request_spec_from_openai(nl_query, fields)
+        with _SPEC_CACHE_LOCK:
+            _SPEC_CACHE[key] = (now + _SPEC_CACHE_TTL_SEC, result)
+            _SPEC_CACHE.move_to_end(key)
+            while len(_SPEC_CACHE) > _SPEC_CACHE_MAX_ENTRIES:
+                _SPEC_CACHE.popitem(last=False)
+    else:
+        result = entry[1]
+    spec, notes, collections = result
+    return copy.deepcopy(spec), notes, list(collections)
+
+
+def _request_spec_from_openai(nl_query: str, fields: List[str]) -> Tuple[Dict[str, Any], Optional[str], List[str]]:
     if OpenAI is None:
         raise RuntimeError("OpenAI SDK not installed. Run: pip install -r requirements.txt")
-    client = OpenAI()
+    client = _openai_client()
 
     prompt = build_llm_prompt(nl_query, fields)
     resp = client.chat.completions.create(
         model=OPENAI_MODEL,
         temperature=0,
+        seed=0,
+        max_tokens=OPENAI_MAX_TOKENS,
         messages=[
             {"role": "system", "content": "You are a precise translator from English to JSON filters."},
             {"role": "user", "content": prompt},
         ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "filter_spec", "schema": SPEC_RESPONSE_SCHEMA, "strict": True},
+        },
     )
-    content = (resp.choices[0].message.content or "").strip()
+    choice = resp.choices[0]
+    if choice.finish_reason == "length":
+        raise ValueError(
+            f"Model reply hit the {OPENAI_MAX_TOKENS}-token limit; simplify the query or raise OPENAI_MAX_TOKENS."
+        )
+    message = choice.message
+    refusal = getattr(message, "refusal", None)
+    if refusal:
+        raise ValueError(f"Model refused the request: {refusal}")
     try:
-        obj = json.loads(content)
-    except json.JSONDecodeError:
-        # best-effort extract first JSON object
-        start = content.find("{")
-        end = content.rfind("}")
-        if start == -1 or end == -1 or end <= start:
-            raise ValueError("Model did not return JSON")
-        obj = json.loads(content[start : end + 1])
+        obj = json.loads(message.content or "")
+    except json.JSONDecodeError as exc:
+        raise ValueError("Model did not return JSON") from exc
 
     if not isinstance(obj, dict) or "spec" not in obj:
         raise ValueError("Model response must be a JSON object with a 'spec' key")
@@ -2162,11 +3419,49 @@ def call_openai_for_spec(nl_query: str, fields: List[str]) -> Tuple[Dict[str, An
     spec = obj["spec"]
     if not isinstance(spec, dict):
         raise ValueError("'spec' must be a JSON object")
+    spec = _drop_null_existence_values(spec)
     raw_collections = obj.get("collections")
     collections = normalize_collection_list(raw_collections)
     return spec, notes if isinstance(notes, str) else None, sorted(set(collections))
 
 
+_QUERY_CACHE_TTL_SEC = 300.0
+_QUERY_CACHE_MAX_ENTRIES = 64
+# Larger results are not kept; re-running them is cheap next to holding their tables in memory.
+_QUERY_CACHE_MAX_ROWS = 5000
+_QUERY_CACHE_LOCK = threading.Lock()
+# key -> (expires_at, render kwargs of a finished /query result), least recently used first.
+_QUERY_CACHE: "OrderedDict[Tuple[bytes, int, int], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def _query_cache_key(nl_query: str, limit: int) -> Tuple[bytes, int, int]:
+    # The load generation keeps results from an older dataset/connection from being reused.
+    digest = hashlib.blake2b(nl_query.encode("utf-8"), digest_size=16).digest()
+    return digest, limit, _LOAD_GENERATION
+
+
+def _query_cache_get(key: Tuple[bytes, int, int]) -> Optional[Dict[str, Any]]:
+    now = time.monotonic()
+    with _QUERY_CACHE_LOCK:
+        entry = _QUERY_CACHE.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del _QUERY_CACHE[key]
+            return None
+        _QUERY_CACHE.move_to_end(key)
+        return entry[1]
+
+
+def _query_cache_put(key: Tuple[bytes, int, int], result: Dict[str, Any]) -> None:
+    expires_at = time.monotonic() + _QUERY_CACHE_TTL_SEC
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE[key] = (expires_at, result)
+        _QUERY_CACHE.move_to_end(key)
+        while len(_QUERY_CACHE) > _QUERY_CACHE_MAX_ENTRIES:
+            _QUERY_CACHE.popitem(last=False)
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     settings_message: Optional[str] = None
@@ -2184,13 +3479,12 @@ def index():
     _ensure_background_data_load()
     _, load_status, load_error, fields, info = _load_state_snapshot()
     error = settings_error or load_error
-    fields_preview = _fields_preview_text(fields)
-    return render_template_string(
-        INDEX_TEMPLATE,
+    fields_preview = _field_views(fields).preview_text
+    return _INDEX_TEMPLATE.render(
         title=APP_TITLE,
         data_source=_runtime_data_source_label(),
         preview_url=_runtime_preview_url_for_form(),
-        referer=_RUNTIME_REFERER,
+        referer=_runtime.referer,
         settings_message=settings_message,
         load_status=load_status,
         load_info=info,
@@ -2240,18 +3534,19 @@ def query():
 
     _ensure_background_data_load()
     ready, load_status, load_error, _, _ = _load_state_snapshot()
-    if not ready:
+    # While the background load runs, answer from the pages received so far.
+    partial = None if ready else _partial_data_snapshot()
+    if not ready and partial is None:
         msg = (
             load_error
             if load_error
             else "Data is still loading from HeartSmart API in the background. Please try again in a few seconds."
         )
-        return render_template_string(
-            INDEX_TEMPLATE,
+        return _INDEX_TEMPLATE.render(
             title=APP_TITLE,
             data_source=_runtime_data_source_label(),
             preview_url=_runtime_preview_url_for_form(),
-            referer=_RUNTIME_REFERER,
+            referer=_runtime.referer,
             settings_message=None,
             load_status=load_status,
             load_info=None,
@@ -2275,14 +3570,17 @@ def query():
         )
 
     try:
-        data, fields, info = load_data_once()
+        if partial is not None:
+            data, fields, _ = partial
+            info = None
+        else:
+            data, fields, info = load_data_once()
     except Exception as e:
-        return render_template_string(
-            INDEX_TEMPLATE,
+        return _INDEX_TEMPLATE.render(
             title=APP_TITLE,
             data_source=_runtime_data_source_label(),
             preview_url=_runtime_preview_url_for_form(),
-            referer=_RUNTIME_REFERER,
+            referer=_runtime.referer,
             settings_message=None,
             load_status=None,
             load_info=None,
@@ -2305,18 +3603,19 @@ def query():
             fields_preview="(No API fields loaded yet.)",
         )
 
-    allowed_fields = set(fields)
-    fields_preview = _fields_preview_text(fields)
+    views = _field_views(fields)
+    allowed_fields, fields_preview = views.allowed, views.preview_text
+    # Keep the progress chip on the page while answering from partial data.
+    live_load_status = load_status if partial is not None else None
 
     if not nl_query:
-        return render_template_string(
-            INDEX_TEMPLATE,
+        return _INDEX_TEMPLATE.render(
             title=APP_TITLE,
             data_source=_runtime_data_source_label(),
             preview_url=_runtime_preview_url_for_form(),
-            referer=_RUNTIME_REFERER,
+            referer=_runtime.referer,
             settings_message=None,
-            load_status=None,
+            load_status=live_load_status,
             load_info=info,
             q=nl_query,
             limit=limit,
@@ -2337,6 +3636,38 @@ def query():
             fields_preview=fields_preview,
         )
 
+    # Repeated questions skip the LLM call and filtering. Partial-data answers are never cached.
+    cache_key = _query_cache_key(nl_query, limit) if partial is None else None
+    cached = _query_cache_get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        return _INDEX_TEMPLATE.render(
+            title=APP_TITLE,
+            data_source=_runtime_data_source_label(),
+            preview_url=_runtime_preview_url_for_form(),
+            referer=_runtime.referer,
+            settings_message=None,
+            load_status=None,
+            load_info=info,
+            q=nl_query,
+            limit=limit,
+            error=None,
+            person_details=None,
+            fields_preview=fields_preview,
+            **cached,
+        )
+
+    # Collections named in the text are known before the model replies; start the remote
+    # cohort query for them now so it overlaps the OpenAI round trip. Only once the load
+    # is done: until then the query would just queue behind the load's cohort lock.
+    extracted_collections = extract_collection_filters_from_text(nl_query)
+    speculative_collections = sorted(set(extracted_collections))
+    remote_cancelled = threading.Event()
+    remote_future = (
+        _REMOTE_QUERY_POOL.submit(run_remote_collection_query, speculative_collections, remote_cancelled)
+        if speculative_collections and partial is None
+        else None
+    )
+
     try:
         spec, notes, llm_collections = call_openai_for_spec(nl_query, fields)
         id_field_for_query = _preferred_id_field_from_fields(fields)
@@ -2346,17 +3677,40 @@ def query():
             fields=fields,
             id_field=id_field_for_query,
         )
-        validate_spec(spec, allowed_fields)
+        spec_info = analyze_spec(spec, allowed_fields)
 
-        extracted_collections = extract_collection_filters_from_text(nl_query)
         requested_collections = sorted(set(llm_collections + extracted_collections))
         server_summary: Optional[str] = None
-
-        if requested_collections:
+        used_fallback = False
+
+        if requested_collections and partial is not None:
+            # The load holds the cohort lock until its last page, so the remote query would
+            # wait for the whole load; scope the rows received so far locally instead.
+            scoped, applied_collections, unavailable_collections = apply_collection_filters(
+                data["rows_as_objects"],
+                requested_collections,
+                fields,
+                column=lambda f: _data_column(data, f),
+            )
+            matched = record_parser.filter_rows({"rows_as_objects": scoped}, spec)
+            extra = (
+                "Remote cohort API is not queried while data is loading; used local heuristic "
+                "fallback. Collection scoping may be incomplete."
+            )
+            notes = f"{notes} | {extra} | {partial[2]}" if notes else f"{extra} | {partial[2]}"
+            server_summary = "Data still loading; fallback mode used."
+            used_fallback = True
+        elif requested_collections:
             try:
-                remote_rows, remote_meta, applied_collections, unavailable_collections = run_remote_collection_query(
-                    requested_collections
-                )
+                if remote_future is not None and requested_collections == speculative_collections:
+                    remote_result = remote_future.result()
+                else:
+                    if remote_future is not None:
+                        # The guess was wrong; keep it from editing the cohort ahead of this query.
+                        remote_cancelled.set()
+                        remote_future.cancel()
+                    remote_result = run_remote_collection_query(requested_collections)
+                remote_rows, remote_meta, applied_collections, unavailable_collections = remote_result
                 matched = record_parser.filter_rows({"rows_as_objects": remote_rows}, spec)
                 server_summary = (
                     f"count={remote_meta.get('count')}, "
@@ -2365,12 +3719,14 @@ def query():
                 )
             except Exception as remote_err:
                 # Fallback to local heuristic behavior if remote API call fails.
-                matched = record_parser.filter_rows(data, spec)
-                matched, applied_collections, unavailable_collections = apply_collection_filters(
-                    matched,
+                # Scope by collection first so the cached column views can be reused.
+                scoped, applied_collections, unavailable_collections = apply_collection_filters(
+                    data["rows_as_objects"],
                     requested_collections,
                     fields,
+                    column=lambda f: _data_column(data, f),
                 )
+                matched = record_parser.filter_rows({"rows_as_objects": scoped}, spec)
                 if _is_auth_error(remote_err):
                     extra = (
                         "Remote cohort API returned 401/403; used local fallback for collection filters. "
@@ -2384,14 +3740,17 @@ def query():
                     )
                 notes = f"{notes} | {extra}" if notes else extra
                 server_summary = "Remote cohort API call failed; fallback mode used."
+                used_fallback = True
         else:
-            matched = record_parser.filter_rows(data, spec)
+            matched = filter_loaded_rows(data, spec)
             applied_collections = []
             unavailable_collections = []
+            if partial is not None:
+                notes = f"{notes} | {partial[2]}" if notes else partial[2]
 
         matched_count = len(matched)
         shown = matched if limit == 0 else matched[:limit]
-        preferred_columns = _fields_in_spec(spec)
+        preferred_columns = list(spec_info.fields)
         table_columns, table_rows, columns_truncated = build_results_table(shown, preferred_columns, max_columns=None)
         assistant_summary = build_assistant_summary(
             nl_query=nl_query,
@@ -2407,24 +3766,13 @@ def query():
             applied_collections=applied_collections,
             spec=spec,
         )
-        return render_template_string(
-            INDEX_TEMPLATE,
-            title=APP_TITLE,
-            data_source=_runtime_data_source_label(),
-            preview_url=_runtime_preview_url_for_form(),
-            referer=_RUNTIME_REFERER,
-            settings_message=None,
-            load_status=None,
-            load_info=info,
-            q=nl_query,
-            limit=limit,
-            spec=json.dumps(spec, ensure_ascii=False, indent=2),
+        result: Dict[str, Any] = dict(
+            spec=_json_pretty(spec),
             notes=notes,
             table_columns=table_columns,
             table_rows=table_rows,
             columns_truncated=columns_truncated,
             matched_count=matched_count,
-            error=None,
             requested_collections=", ".join(
                 f"{c} ({SITE_COLLECTION_NAME_BY_ID.get(c, c)})" for c in requested_collections
             ) or None,
@@ -2436,17 +3784,32 @@ def query():
             ) or None,
             server_summary=server_summary,
             assistant_summary=assistant_summary,
-            person_details=None,
             query_to_run=query_to_run,
+        )
+        # Fallback answers are not cached so the next attempt retries the remote cohort API.
+        if cache_key is not None and not used_fallback and len(table_rows) <= _QUERY_CACHE_MAX_ROWS:
+            _query_cache_put(cache_key, result)
+        return _INDEX_TEMPLATE.render(
+            title=APP_TITLE,
+            data_source=_runtime_data_source_label(),
+            preview_url=_runtime_preview_url_for_form(),
+            referer=_runtime.referer,
+            settings_message=None,
+            load_status=live_load_status,
+            load_info=info,
+            q=nl_query,
+            limit=limit,
+            error=None,
+            person_details=None,
             fields_preview=fields_preview,
+            **result,
         )
     except Exception as e:
-        return render_template_string(
-            INDEX_TEMPLATE,
+        return _INDEX_TEMPLATE.render(
             title=APP_TITLE,
             data_source=_runtime_data_source_label(),
             preview_url=_runtime_preview_url_for_form(),
-            referer=_RUNTIME_REFERER,
+            referer=_runtime.referer,
             settings_message=None,
             load_status=None,
             load_info=info,
@@ -2468,8 +3831,17 @@ def query():
             query_to_run=None,
             fields_preview=fields_preview,
         )
+    finally:
+        # A failed request must not leave its speculative cohort query to run; a consumed
+        # future is unaffected.
+        if remote_future is not None:
+            remote_cancelled.set()
+            remote_future.cancel()
 
 
 if __name__ == "__main__":
-    # For local dev. In production, run via gunicorn/uwsgi.
-    app.run(host="127.0.0.1", port=int(os.environ.get("PORT", "5050")), debug=True)
+    # For local dev. In production, run via gunicorn with threaded workers (see Dockerfile):
+    #   gunicorn -b 127.0.0.1:${PORT:-5050} -w 1 -k gthread --threads 32 --timeout 1800 app:app
+    # The debugger/reloader is opt-in via FLASK_DEBUG=1; its reloader process would also
+    # start a second data load.
+    app.run(host="127.0.0.1", port=int(os.environ.get("PORT", "5050")))
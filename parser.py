@@ -1,8 +1,65 @@
+import functools
 import json
+import operator
 import re
-from typing import Any, Dict, List, Optional, Union
-
-Json = Union[Dict[str, Any], List[Any], str, int, float, bool, None]
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+__all__ = [
+    "load_json",
+    "get_by_path",
+    "coerce_number",
+    "canonical_gender_token",
+    "match_condition",
+    "matches",
+    "compile_condition",
+    "compile_spec",
+    "filter_rows",
+    "NUMERIC_COMPARE",
+    "OP_COST",
+]
+
+_GENDER_SUB = re.compile(r"[^a-z]+")
+# ASCII-only input: the same "keep a-z" step as _GENDER_SUB, as one translate pass.
+_GENDER_KEEP_AZ = str.maketrans("", "", "".join(chr(c) for c in range(128) if not "a" <= chr(c) <= "z"))
+_MALE_TOKENS = frozenset({"m", "male", "males", "man", "men"})
+_FEMALE_TOKENS = frozenset({"f", "female", "females", "woman", "women"})
+_YEARS_RE = re.compile(r"([-+]?\d+(?:\.\d+)?)\s*years?\b", re.IGNORECASE)
+_NUM_RE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+_FLOAT_START = frozenset("+-.0123456789nNiI")
+NUMERIC_COMPARE: Dict[str, Callable[[float, float], bool]] = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+# Rough per-row cost of each op, used to order the children of and/or nodes
+# (here and in the app's column-wise evaluator).
+OP_COST: Dict[str, int] = {
+    "exists": 0,
+    "isnull": 0,
+    "eq": 1,
+    "ne": 1,
+    "in": 1,
+    "nin": 1,
+    "startswith": 2,
+    "endswith": 2,
+    "contains": 2,
+    "gt": 3,
+    "gte": 3,
+    "lt": 3,
+    "lte": 3,
+    "regex": 4,
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_regex(pattern: str) -> Optional["re.Pattern[str]"]:
+    # None for invalid patterns, so a bad pattern is not re-parsed for every row.
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return None
 
 
 def load_json(path: str) -> Dict[str, Any]:
@@ -10,6 +67,11 @@ def load_json(path: str) -> Dict[str, Any]:
         return json.load(f)
 
 
+@functools.lru_cache(maxsize=1024)
+def _split_path(path: str) -> Tuple[str, ...]:
+    return tuple(path.split("."))
+
+
 def get_by_path(obj: Dict[str, Any], path: str) -> Any:
     """
     Dot-path lookup. Example: get_by_path(record, "DNA Sample Type")
@@ -17,8 +79,11 @@ def get_by_path(obj: Dict[str, Any], path: str) -> Any:
     """
     if not path:
         return None
+    if isinstance(path, str) and "." not in path:
+        # Flat field names are the common case.
+        return obj.get(path) if isinstance(obj, dict) else None
     cur: Any = obj
-    for key in path.split("."):
+    for key in _split_path(path) if isinstance(path, str) else path.split("."):
         if isinstance(cur, dict) and key in cur:
             cur = cur[key]
         else:
@@ -30,25 +95,35 @@ def _norm_str(x: Any) -> str:
     return str(x).strip().lower()
 
 
-def _canonical_gender_token(x: Any) -> Optional[str]:
+def canonical_gender_token(x: Any) -> Optional[str]:
+    """
+    "male"/"female" for strings that eq/in treat as gender values ("M", "Females", "men"),
+    else None. Two gender-like strings are equal when their tokens are.
+    """
     if not isinstance(x, str):
         return None
-    token = re.sub(r"[^a-z]+", "", x.lower())
-    if token in {"m", "male", "males", "man", "men"}:
+    if x.isascii():
+        token = x.lower().translate(_GENDER_KEEP_AZ)
+    else:
+        token = _GENDER_SUB.sub("", x.lower())
+    if token in _MALE_TOKENS:
         return "male"
-    if token in {"f", "female", "females", "woman", "women"}:
+    if token in _FEMALE_TOKENS:
         return "female"
     return None
 
 
 def _text_equal(a: Any, b: Any) -> bool:
-    ga = _canonical_gender_token(a)
-    gb = _canonical_gender_token(b)
+    # Gender tokens and text folding only apply when both sides are strings.
+    if not isinstance(a, str) or not isinstance(b, str):
+        return a == b
+    if a is b:
+        return True
+    ga = canonical_gender_token(a)
+    gb = canonical_gender_token(b)
     if ga is not None and gb is not None:
         return ga == gb
-    if isinstance(a, str) and isinstance(b, str):
-        return _norm_str(a) == _norm_str(b)
-    return a == b
+    return _norm_str(a) == _norm_str(b)
 
 
 def coerce_number(x: Any) -> Optional[float]:
@@ -58,27 +133,115 @@ def coerce_number(x: Any) -> Optional[float]:
         s = x.strip()
         if not s:
             return None
-        s_clean = s.replace(",", "")
-        try:
-            return float(s_clean)
-        except ValueError:
-            # Age-like strings are common, e.g. "20 years, 196 days".
-            m_years = re.search(r"([-+]?\d+(?:\.\d+)?)\s*years?\b", s_clean, flags=re.IGNORECASE)
-            if m_years:
-                try:
-                    return float(m_years.group(1))
-                except ValueError:
-                    pass
-            m_any = re.search(r"[-+]?\d+(?:\.\d+)?", s_clean)
-            if m_any:
-                try:
-                    return float(m_any.group(0))
-                except ValueError:
-                    return None
-            return None
+        if "," in s:
+            s_clean = s.replace(",", "")
+            core = s_clean.strip()
+        else:
+            s_clean = core = s
+        # float() cannot parse text with an inner space or one that starts outside
+        # [+-.0-9nNiI], so skip the raise/catch for those and go straight to the regexes.
+        c = core[:1]
+        if " " not in core and (c in _FLOAT_START or c.isdecimal()):
+            try:
+                return float(s_clean)
+            except ValueError:
+                pass
+        # Age-like strings are common, e.g. "20 years, 196 days".
+        m_years = _YEARS_RE.search(s_clean)
+        if m_years:
+            try:
+                return float(m_years.group(1))
+            except ValueError:
+                pass
+        m_any = _NUM_RE.search(s_clean)
+        if m_any:
+            try:
+                return float(m_any.group(0))
+            except ValueError:
+                return None
+        return None
     return None
 
 
+def _match_eq(value: Any, expected: Any) -> bool:
+    return _text_equal(value, expected)
+
+
+def _match_ne(value: Any, expected: Any) -> bool:
+    return not _text_equal(value, expected)
+
+
+def _match_in(value: Any, expected: Any) -> bool:
+    if not isinstance(expected, list):
+        return False
+    if isinstance(value, str):
+        return any(_text_equal(value, item) for item in expected)
+    return value in expected
+
+
+def _match_nin(value: Any, expected: Any) -> bool:
+    if not isinstance(expected, list):
+        return True
+    if isinstance(value, str):
+        return all(not _text_equal(value, item) for item in expected)
+    return value not in expected
+
+
+def _match_contains(value: Any, expected: Any) -> bool:
+    if value is None:
+        return False
+    s_fold = str(value).lower()
+    return ("" if expected is None else str(expected)).lower() in s_fold
+
+
+def _match_startswith(value: Any, expected: Any) -> bool:
+    if value is None:
+        return False
+    s_fold = str(value).lower()
+    return s_fold.startswith(("" if expected is None else str(expected)).lower())
+
+
+def _match_endswith(value: Any, expected: Any) -> bool:
+    if value is None:
+        return False
+    s_fold = str(value).lower()
+    return s_fold.endswith(("" if expected is None else str(expected)).lower())
+
+
+def _match_regex(value: Any, expected: Any) -> bool:
+    if value is None:
+        return False
+    s = str(value)
+    compiled = _compile_regex("" if expected is None else str(expected))
+    return compiled is not None and compiled.search(s) is not None
+
+
+def _numeric_matcher(compare: Callable[[float, float], bool]) -> Callable[[Any, Any], bool]:
+    # Numeric comparisons are best effort: either side failing to coerce is a non-match.
+    def match_number(value: Any, expected: Any) -> bool:
+        a = coerce_number(value)
+        b = coerce_number(expected)
+        return a is not None and b is not None and compare(a, b)
+
+    return match_number
+
+
+# One lookup per leaf instead of walking an if-chain of op names.
+_MATCH_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "exists": lambda value, expected: value is not None,
+    "isnull": lambda value, expected: value is None,
+    "eq": _match_eq,
+    "ne": _match_ne,
+    "in": _match_in,
+    "nin": _match_nin,
+    "contains": _match_contains,
+    "startswith": _match_startswith,
+    "endswith": _match_endswith,
+    "regex": _match_regex,
+    **{op: _numeric_matcher(compare) for op, compare in NUMERIC_COMPARE.items()},
+}
+
+
 def match_condition(value: Any, cond: Dict[str, Any]) -> bool:
     """
     cond examples:
@@ -91,67 +254,10 @@ def match_condition(value: Any, cond: Dict[str, Any]) -> bool:
       {"field": "Blinded ID", "op": "regex", "value": r"^0000-0011-09"}
     """
     op = cond.get("op", "eq")
-    expected = cond.get("value", None)
-
-    if op == "exists":
-        return value is not None
-    if op == "isnull":
-        return value is None
-
-    if op == "eq":
-        return _text_equal(value, expected)
-    if op == "ne":
-        return not _text_equal(value, expected)
-    if op == "in":
-        if not isinstance(expected, list):
-            return False
-        if isinstance(value, str):
-            return any(_text_equal(value, item) for item in expected)
-        return value in expected
-    if op == "nin":
-        if not isinstance(expected, list):
-            return True
-        if isinstance(value, str):
-            return all(not _text_equal(value, item) for item in expected)
-        return value not in expected
-
-    # string-ish operators
-    if op in {"contains", "startswith", "endswith", "regex"}:
-        if value is None:
-            return False
-        s = str(value)
-        t = "" if expected is None else str(expected)
-        s_fold = s.lower()
-        t_fold = t.lower()
-
-        if op == "contains":
-            return t_fold in s_fold
-        if op == "startswith":
-            return s_fold.startswith(t_fold)
-        if op == "endswith":
-            return s_fold.endswith(t_fold)
-        if op == "regex":
-            try:
-                return re.search(t, s, flags=re.IGNORECASE) is not None
-            except re.error:
-                return False
-
-    # numeric comparisons (best effort)
-    if op in {"gt", "gte", "lt", "lte"}:
-        a = coerce_number(value)
-        b = coerce_number(expected)
-        if a is None or b is None:
-            return False
-        if op == "gt":
-            return a > b
-        if op == "gte":
-            return a >= b
-        if op == "lt":
-            return a < b
-        if op == "lte":
-            return a <= b
-
-    raise ValueError(f"Unsupported op: {op}")
+    handler = _MATCH_OPS.get(op)
+    if handler is None:
+        raise ValueError(f"Unsupported op: {op}")
+    return handler(value, cond.get("value", None))
 
 
 def matches(record: Dict[str, Any], spec: Dict[str, Any]) -> bool:
@@ -175,11 +281,281 @@ def matches(record: Dict[str, Any], spec: Dict[str, Any]) -> bool:
     return match_condition(value, spec)
 
 
+def compile_spec(spec: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compiles spec once into a predicate equivalent to `lambda record: matches(record, spec)`,
+    so the tree walk, path split and per-op setup are not repeated for every row.
+    Nodes outside the documented shapes are left to `matches` itself.
+    """
+    if not isinstance(spec, dict):
+        return lambda record: matches(record, spec)
+
+    if "and" in spec or "or" in spec:
+        is_and = "and" in spec
+        items = spec["and" if is_and else "or"]
+        if isinstance(items, list) and len(items) > 1:
+            costs = [_spec_cost(s) for s in items]
+            known = [c for c in costs if c is not None]
+            if len(known) == len(costs):
+                # Every child is a pure test here, so cheap ones can go first without
+                # changing the result; the sort is stable, so ties keep spec order.
+                items = [items[i] for i in sorted(range(len(items)), key=lambda i: known[i])]
+        try:
+            children = [compile_spec(s) for s in items]
+        except TypeError:
+            return lambda record: matches(record, spec)
+        if is_and:
+
+            def match_all(record: Dict[str, Any]) -> bool:
+                for child in children:
+                    if not child(record):
+                        return False
+                return True
+
+            return match_all
+
+        def match_any(record: Dict[str, Any]) -> bool:
+            for child in children:
+                if child(record):
+                    return True
+            return False
+
+        return match_any
+
+    if "not" in spec:
+        inner = compile_spec(spec["not"])
+        return lambda record: not inner(record)
+
+    field = spec.get("field")
+    if not isinstance(field, str):
+        return lambda record: matches(record, spec)
+    return _compile_leaf(field, compile_condition(spec), spec.get("op", "eq") not in ("exists", "isnull"))
+
+
+
+def _spec_cost(spec: Any) -> Optional[int]:
+    """
+    Estimated cost of evaluating spec for one row, or None when the node may raise
+    (unsupported op, malformed node) and so has to keep its place among its siblings.
+    """
+    if not isinstance(spec, dict):
+        return None
+    if "and" in spec or "or" in spec:
+        items = spec["and" if "and" in spec else "or"]
+        if not isinstance(items, list):
+            return None
+        total = 0
+        for item in items:
+            cost = _spec_cost(item)
+            if cost is None:
+                return None
+            total += cost
+        return total
+    if "not" in spec:
+        return _spec_cost(spec["not"])
+    op = spec.get("op", "eq")
+    if not isinstance(spec.get("field"), str) or not isinstance(op, str):
+        return None
+    return OP_COST.get(op)
+
+
+def _compile_path(path: str) -> Callable[[Any], Any]:
+    """Getter equivalent to `lambda obj: get_by_path(obj, path)`."""
+    if not path:
+        return lambda obj: None
+    keys = _split_path(path)
+    if len(keys) == 1:
+        return lambda obj: obj.get(path) if isinstance(obj, dict) else None
+
+    def walk(obj: Any) -> Any:
+        cur = obj
+        for key in keys:
+            if isinstance(cur, dict) and key in cur:
+                cur = cur[key]
+            else:
+                return None
+        return cur
+
+    return walk
+
+
+def compile_condition(cond: Dict[str, Any]) -> Callable[[Any], bool]:
+    """
+    Compiles a leaf condition into a value test equivalent to
+    `lambda value: match_condition(value, cond)`, with the expected side prepared once.
+    """
+    op = cond.get("op", "eq")
+    expected = cond.get("value", None)
+
+    if op == "exists":
+        return lambda value: value is not None
+    if op == "isnull":
+        return lambda value: value is None
+
+    if op in ("eq", "ne"):
+        equal = _compile_text_equal(expected)
+        return equal if op == "eq" else (lambda value: not equal(value))
+    if op in ("in", "nin"):
+        if not isinstance(expected, list):
+            return (lambda value: False) if op == "in" else (lambda value: True)
+        member = _compile_text_member(expected)
+        return member if op == "in" else (lambda value: not member(value))
+
+    if op in ("contains", "startswith", "endswith", "regex"):
+        t = "" if expected is None else str(expected)
+        if op == "regex":
+            compiled = _compile_regex(t)
+            if compiled is None:
+                return lambda value: False
+            search = compiled.search
+            return lambda value: value is not None and search(str(value)) is not None
+        t_fold = t.lower()
+        if not t_fold:
+            return lambda value: value is not None
+        if op == "contains":
+            return lambda value: value is not None and t_fold in str(value).lower()
+        if not t_fold.isascii():
+            if op == "startswith":
+                return lambda value: value is not None and str(value).lower().startswith(t_fold)
+            return lambda value: value is not None and str(value).lower().endswith(t_fold)
+        # Lowercasing never changes the length of ASCII text, so only the compared
+        # end of an ASCII value needs folding.
+        n = len(t_fold)
+
+        def match_affix(value: Any) -> bool:
+            if value is None:
+                return False
+            s = str(value)
+            if s.isascii():
+                return (s[:n] if op == "startswith" else s[-n:]).lower() == t_fold
+            return s.lower().startswith(t_fold) if op == "startswith" else s.lower().endswith(t_fold)
+
+        return match_affix
+
+    if op in ("gt", "gte", "lt", "lte"):
+        b = coerce_number(expected)
+        if b is None:
+            return lambda value: False
+        compare = NUMERIC_COMPARE[op]
+
+        def match_number(value: Any) -> bool:
+            a = coerce_number(value)
+            return a is not None and compare(a, b)
+
+        return match_number
+
+    # Unsupported ops still raise from match_condition, only once a value reaches them.
+    return lambda value: match_condition(value, cond)
+
+
+def _compile_text_equal(expected: Any) -> Callable[[Any], bool]:
+    """`lambda value: _text_equal(value, expected)` with expected's gender token and folding done once."""
+    if not isinstance(expected, str):
+        return lambda value: value == expected
+    expected_gender = canonical_gender_token(expected)
+    expected_norm = _norm_str(expected)
+
+    def equal(value: Any) -> bool:
+        if not isinstance(value, str):
+            return value == expected
+        if expected_gender is not None:
+            gender = canonical_gender_token(value)
+            if gender is not None:
+                return gender == expected_gender
+        return _norm_str(value) == expected_norm
+
+    return equal
+
+
+def _compile_text_member(expected: List[Any]) -> Callable[[Any], bool]:
+    """
+    `in` membership as match_condition defines it: string values use _text_equal
+    against each item, other values plain `value in expected`. Both sides become
+    set lookups built once.
+    """
+    genders: Set[str] = set()  # gender tokens of gender-like string items
+    all_norms: Set[str] = set()  # folded text of every string item
+    non_gender_norms: Set[str] = set()  # folded text of string items that are not gender-like
+    other_items: List[Any] = []  # non-string items, compared with == against string values
+    for item in expected:
+        if isinstance(item, str):
+            norm = _norm_str(item)
+            all_norms.add(norm)
+            gender = canonical_gender_token(item)
+            if gender is None:
+                non_gender_norms.add(norm)
+            else:
+                genders.add(gender)
+        else:
+            other_items.append(item)
+    try:
+        hashed: Optional[FrozenSet[Any]] = frozenset(expected)
+    except TypeError:
+        hashed = None
+
+    def member(value: Any) -> bool:
+        if isinstance(value, str):
+            gender = canonical_gender_token(value)
+            if gender is not None:
+                # Gender-like items only match gender-like values by token.
+                if gender in genders:
+                    return True
+                found = _norm_str(value) in non_gender_norms
+            else:
+                found = _norm_str(value) in all_norms
+            return found or (bool(other_items) and any(value == item for item in other_items))
+        if hashed is not None:
+            try:
+                return value in hashed
+            except TypeError:
+                pass
+        return value in expected
+
+    return member
+
+
+# Per-leaf memo bound; past it, new values are tested without being remembered.
+_MEMO_MAX_VALUES = 4096
+
+
+def _compile_leaf(field: str, test: Callable[[Any], bool], memoize: bool) -> Callable[[Dict[str, Any]], bool]:
+    """
+    `lambda record: test(get_by_path(record, field))` as one closure, so a leaf costs a
+    single call per row. With memoize, `test` runs once per distinct string cell: columns
+    repeat a handful of category strings across every row, and each string test (gender
+    probe, folding, regex, number parsing) then runs once per value instead of once per row.
+    """
+    get = _compile_path(field)
+    if not memoize:
+        return lambda record: test(get(record))
+    flat = bool(field) and "." not in field
+    seen: Dict[str, bool] = {}
+
+    def leaf(record: Dict[str, Any]) -> bool:
+        if flat:
+            value = record.get(field) if isinstance(record, dict) else None
+        else:
+            value = get(record)
+        if type(value) is not str:
+            return test(value)
+        hit = seen.get(value)
+        if hit is None:
+            hit = test(value)
+            if len(seen) < _MEMO_MAX_VALUES:
+                seen[value] = hit
+        return hit
+
+    return leaf
+
+
 def filter_rows(data: Dict[str, Any], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
     rows = data.get("rows_as_objects", [])
     if not isinstance(rows, list):
         raise ValueError("Expected data['rows_as_objects'] to be a list")
-    return [r for r in rows if isinstance(r, dict) and matches(r, spec)]
+    if not rows:
+        return []
+    predicate = compile_spec(spec)
+    return [r for r in rows if isinstance(r, dict) and predicate(r)]
 
 
 def main():